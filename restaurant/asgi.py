@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant.settings')
 
 application = get_asgi_application()
+
+from restaurantApp.startup import on_worker_start  # noqa: E402
+
+on_worker_start()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,11 +43,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'restaurantApp.middleware.RequestSizeLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'restaurantApp.middleware.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'restaurantApp.middleware.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -81,6 +85,25 @@ DATABASES = {
     }
 }
 
+# Read replicas
+# RESTAURANT_REPLICA_PATHS lists read-only copies of the database, separated by
+# os.pathsep. Menu reads are spread across them by restaurantApp.routers and a
+# session reads from the primary for RESTAURANT_REPLICA_PIN_SECONDS after it writes.
+
+for index, path in enumerate(filter(None, os.environ.get('RESTAURANT_REPLICA_PATHS', '').split(os.pathsep)), 1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro',
+        'OPTIONS': {'uri': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+RESTAURANT_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+RESTAURANT_REPLICA_PIN_SECONDS = 5
+
+DATABASE_ROUTERS = ['restaurantApp.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -122,3 +145,108 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Background jobs
+# Dependent groups with more ingredient x column cells than this have their
+# rules generated by the in-process job runner instead of the request thread.
+
+RESTAURANT_BACKGROUND_MATRIX_SIZE = 2500
+
+RESTAURANT_RULE_BATCH_SIZE = 500
+
+RESTAURANT_JOB_WORKERS = 2
+
+# A running job that has not reported progress for this many seconds is
+# treated as orphaned by a stopped worker and failed; queued jobs this old
+# are re-submitted at start-up
+RESTAURANT_JOB_STALE_SECONDS = 300
+
+
+# Change log
+# A full snapshot of a group is written after this many deltas, which bounds
+# the replay needed to rebuild a group at a point in time.
+
+RESTAURANT_SNAPSHOT_INTERVAL = 20
+
+
+# Start-up
+# Warm URL resolvers, templates and the database when the WSGI/ASGI
+# application is loaded so the first request is not much slower than the rest.
+
+RESTAURANT_WARM_UP = os.environ.get('RESTAURANT_WARM_UP', '1') == '1'
+
+RESTAURANT_WARM_MENUS = 100
+
+
+# Profiling
+# Off by default; when off the profiling middleware removes itself. When on,
+# this fraction of requests is profiled and aggregated per view, and staff can
+# profile a single request by sending the X-Profile header. Results are under
+# /profiling/ for staff. Per-view results are kept by each worker process;
+# single-request profiles go to RESTAURANT_PROFILE_DIR (default: a
+# restaurant-profiles directory in the system temp dir) so any worker on the
+# host can serve them.
+
+RESTAURANT_PROFILING = os.environ.get('RESTAURANT_PROFILING', '0') == '1'
+
+RESTAURANT_PROFILE_SAMPLE_RATE = 0.01
+
+RESTAURANT_PROFILE_HEADER = 'X-Profile'
+
+RESTAURANT_PROFILE_INTERVAL = 0.005
+
+RESTAURANT_PROFILE_KEEP = 20
+
+RESTAURANT_PROFILE_DIR = os.environ.get('RESTAURANT_PROFILE_DIR') or None
+
+
+# Group size limits
+# Create/edit submissions over these limits are rejected with 413 before
+# anything is written.
+
+RESTAURANT_MAX_REQUEST_BYTES = 2_621_440
+
+# RequestSizeLimitMiddleware answers 413 first; keep Django's own limit equal
+DATA_UPLOAD_MAX_MEMORY_SIZE = RESTAURANT_MAX_REQUEST_BYTES
+
+RESTAURANT_MAX_PREFERENCES = 300
+
+RESTAURANT_MAX_INGREDIENTS = 300
+
+RESTAURANT_MAX_COLUMNS = 100
+
+RESTAURANT_MAX_RULE_CELLS = 10000
+
+# Room for every ingredient, column and preference name/price pair
+DATA_UPLOAD_MAX_NUMBER_FIELDS = 2 * (RESTAURANT_MAX_PREFERENCES + RESTAURANT_MAX_INGREDIENTS + RESTAURANT_MAX_COLUMNS) + 100
+
+
+# Customer menus
+# Compiled menus (JSON plus HTML fragment) are kept per process in an LRU
+# bounded by this many bytes.
+
+RESTAURANT_MENU_CACHE_BYTES = 16 * 1024 * 1024
+
+# Per-group price tables (integer cents per preference and cell) are kept per
+# process in an LRU bounded by this many bytes
+RESTAURANT_PRICE_CACHE_BYTES = 4 * 1024 * 1024
+
+# How often, in seconds, a worker checks whether another worker changed a group
+RESTAURANT_CACHE_CHECK_INTERVAL = 0.5
+
+
+# Menu validation (manage.py validate_menu)
+# Stored groups are checked in the calling process by default. With more
+# workers, each worker process loads and checks its own ranges of this many
+# groups by id; menus read from a file are always checked in process.
+
+RESTAURANT_VALIDATION_WORKERS = 1
+RESTAURANT_VALIDATION_CHUNK_SIZE = 2000
+
+
+# Admin
+# Changelists longer than 10000 rows show a row count from SQLite's table
+# statistics, re-analysed (sampled) when older than this many seconds.
+
+RESTAURANT_TABLE_STATS_MAX_AGE = 3600
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant.settings')
 
 application = get_wsgi_application()
+
+from restaurantApp.startup import on_worker_start  # noqa: E402
+
+on_worker_start()
@@ -1,3 +1,266 @@
+import time
+
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+
+from . import history
+from .models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+)
+
+
+# (alias, table) -> time.monotonic() of this process's last ANALYZE
+_analyzed_at = {}
+
+
+def refresh_table_statistics(model, using="default"):
+    """Re-run ANALYZE on a SQLite table whose statistics are older than
+    RESTAURANT_TABLE_STATS_MAX_AGE seconds in this process.
+
+    ``analysis_limit`` keeps it to a sample of each index, so even the rule
+    table is analysed in milliseconds.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    max_age = getattr(settings, "RESTAURANT_TABLE_STATS_MAX_AGE", 3600)
+    now = time.monotonic()
+    if connection.vendor != "sqlite" or now - _analyzed_at.get((using, table), -max_age - 1) <= max_age:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA analysis_limit = 1000")
+        cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+    _analyzed_at[using, table] = now
+
+
+def estimated_row_count(model, using="default"):
+    """Cheap row count estimate from table statistics, or None if unavailable"""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == "sqlite":
+            refresh_table_statistics(model, using)
+            # Every sqlite_stat1 row for the table starts with its row count
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Avoid COUNT(*) over the whole table on large changelists.
+
+    Lists are counted exactly up to ``count_limit`` rows. Only unfiltered
+    lists longer than that use the table statistics, and never report fewer
+    rows than were counted.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        counted = queryset[:self.count_limit + 1].count()
+        if counted <= self.count_limit or queryset.query.where:
+            return counted
+        return max(estimated_row_count(queryset.model, queryset.db) or 0, counted)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Only load one page of the related rows into the formset"""
+    page_number = 1
+    per_page = 50
+
+    def get_queryset(self):
+        if not hasattr(self, "page_obj"):
+            self.page_obj = Paginator(super().get_queryset(), self.per_page).get_page(self.page_number)
+        return self.page_obj.object_list
+
+
+class PaginatedTabularInline(admin.TabularInline):
+    formset = PaginatedInlineFormSet
+    template = "admin/restaurantApp/paginated_tabular.html"
+    extra = 0
+    per_page = 50
+
+    def page_param(self):
+        return f"{self.model._meta.model_name}_page"
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.page_number = request.GET.get(self.page_param(), 1)
+        formset.per_page = self.per_page
+        formset.page_param = self.page_param()
+        return formset
+
+
+class VersionedGroupAdmin(admin.ModelAdmin):
+    """Bump the owning group's version and log the change after admin saves and deletes"""
+
+    def get_group_id(self, obj):
+        return obj.group_id
+
+    def log_group_changes(self, group_ids):
+        PreferenceGroup.objects.filter(id__in=group_ids).bump_version()
+        history.record_changes(group_ids)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.log_group_changes([self.get_group_id(form.instance)])
+
+    def delete_model(self, request, obj):
+        group_id = self.get_group_id(obj)
+        super().delete_model(request, obj)
+        self.log_group_changes([group_id])
+
+    def delete_queryset(self, request, queryset):
+        group_ids = {self.get_group_id(obj) for obj in queryset}
+        super().delete_queryset(request, queryset)
+        self.log_group_changes(group_ids)
+
+
+class PreferenceInline(PaginatedTabularInline):
+    model = Preference
+    fields = ("name", "price", "order_index")
+
+
+class DependentIngredientInline(PaginatedTabularInline):
+    model = DependentIngredient
+    fields = ("name", "price", "order_index")
+    show_change_link = True
+
+
+class DependentColumnInline(PaginatedTabularInline):
+    model = DependentColumn
+    fields = ("name", "price", "order_index")
+    show_change_link = True
+
+
+class DependentRuleInline(PaginatedTabularInline):
+    """Edit the flags of existing cells; cells come from the group's matrix"""
+    model = DependentRule
+    fields = ("ingredient_name", "column_name", "show", "default", "required", "allow_more")
+    readonly_fields = ("ingredient_name", "column_name")
+    can_delete = False
+    max_num = 0
+
+    @admin.display(description="Ingredient")
+    def ingredient_name(self, obj):
+        return obj.ingredient.name
+
+    @admin.display(description="Column")
+    def column_name(self, obj):
+        return obj.column.name
+
+
+class IngredientRuleInline(DependentRuleInline):
+    fk_name = "ingredient"
+
+
+class ColumnRuleInline(DependentRuleInline):
+    fk_name = "column"
+
+
+@admin.register(PreferenceGroup)
+class PreferenceGroupAdmin(VersionedGroupAdmin):
+    list_display = ("name", "group_type", "group_option", "pricing_method", "version", "created_at")
+    list_filter = ("group_type", "pricing_method")
+    search_fields = ("name",)
+    readonly_fields = ("version", "created_at")
+    date_hierarchy = "created_at"
+    inlines = (PreferenceInline, DependentIngredientInline, DependentColumnInline)
+
+    def get_group_id(self, obj):
+        return obj.pk
+
+    def log_group_changes(self, group_ids):
+        # Deleted groups are logged by delete_model/delete_queryset instead
+        super().log_group_changes(PreferenceGroup.objects.filter(id__in=group_ids).values_list("id", flat=True))
+
+    def delete_model(self, request, obj):
+        history.record_deletion(obj)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for group in queryset:
+            history.record_deletion(group)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(Preference)
+class PreferenceAdmin(VersionedGroupAdmin):
+    list_display = ("name", "group", "price", "order_index")
+    list_select_related = ("group",)
+    list_filter = ("group__group_type",)
+    search_fields = ("name", "group__name")
+    raw_id_fields = ("group",)
+
+
+@admin.register(DependentIngredient)
+class DependentIngredientAdmin(VersionedGroupAdmin):
+    list_display = ("name", "group", "price", "order_index")
+    list_select_related = ("group",)
+    search_fields = ("name", "group__name")
+    raw_id_fields = ("group",)
+    inlines = (IngredientRuleInline,)
+
+
+@admin.register(DependentColumn)
+class DependentColumnAdmin(VersionedGroupAdmin):
+    list_display = ("name", "group", "price", "order_index")
+    list_select_related = ("group",)
+    search_fields = ("name", "group__name")
+    raw_id_fields = ("group",)
+    inlines = (ColumnRuleInline,)
+
+
+class GroupIdFilter(admin.SimpleListFilter):
+    """Filter rules by ?group=<id> without listing every group in the sidebar"""
+    title = "group"
+    parameter_name = "group"
+
+    def lookups(self, request, model_admin):
+        group_id = self.value()
+        if not group_id or not group_id.isdigit():
+            return []
+        return PreferenceGroup.objects.filter(id=group_id).values_list("id", "name")
+
+    def queryset(self, request, queryset):
+        group_id = self.value()
+        if group_id and group_id.isdigit():
+            # Through the indexed column foreign key
+            return queryset.filter(column__in=DependentColumn.objects.filter(group_id=group_id))
+        return queryset
+
+
+@admin.register(DependentRule)
+class DependentRuleAdmin(VersionedGroupAdmin):
+    list_display = ("__str__", "group_name", "show", "default", "required", "allow_more")
+    list_select_related = ("ingredient", "column", "column__group")
+    list_filter = (GroupIdFilter,)
+    raw_id_fields = ("ingredient", "column")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # The default manager already joins ingredient and column, and the
+        # changelist skips list_select_related for querysets that join anything
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    @admin.display(description="Group")
+    def group_name(self, obj):
+        return format_html('<a href="?group={}">{}</a>', obj.column.group_id, obj.column.group.name)
 
-# Register your models here.
+    def get_group_id(self, obj):
+        return obj.column.group_id
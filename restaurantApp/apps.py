@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RestaurantappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurantApp'
+
+    def ready(self):
+        # Connect the cache invalidation receivers
+        from . import menu, pricing  # noqa: F401
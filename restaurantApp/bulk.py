@@ -0,0 +1,182 @@
+"""Set-based bulk operations across many preference groups.
+
+Every operation is expressed as a filter plus an update and compiles to a
+single UPDATE statement per table, so changing a price on every "Large"
+column does not require loading or rewriting any group. Operations must be
+filtered (by name or group ids); there is no "every row" operation. Each
+returns the number of rows it updated and the ids of the groups it touched,
+whose versions are bumped. The change log gets the delta each operation made,
+read back for just the updated rows, so the touched groups are not serialised.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+)
+from . import history
+from .pricing import MAX_PRICE
+
+
+PRICE_TARGETS = {
+    "preference": Preference,
+    "ingredient": DependentIngredient,
+    "column": DependentColumn,
+}
+SECTIONS = {
+    "preference": "preferences",
+    "ingredient": "ingredients",
+    "column": "columns",
+}
+RULE_FLAGS = ("show", "default", "required", "allow_more")
+
+
+class BulkOperationError(ValueError):
+    """Raised when a bulk operation is malformed."""
+
+
+# Prices are DecimalField(max_digits=8, decimal_places=2)
+def _parse_decimal(value, field):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise BulkOperationError(f"'{field}' must be a number")
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise BulkOperationError(f"'{field}' must be a number")
+    if not number.is_finite() or abs(number) > MAX_PRICE:
+        raise BulkOperationError(f"'{field}' must be a number between -{MAX_PRICE} and {MAX_PRICE}")
+    return number
+
+
+def _check_ids(value, field):
+    if not isinstance(value, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in value):
+        raise BulkOperationError(f"'{field}' must be a list of integer ids")
+    return value
+
+
+def _check_name(value, field):
+    if value is not None and not isinstance(value, str):
+        raise BulkOperationError(f"'{field}' must be a string")
+    return value
+
+
+def _require_filter(op, **filters):
+    if all(value is None for value in filters.values()):
+        names = ", ".join(f"'{name}'" for name in filters)
+        raise BulkOperationError(f"'{op}' needs at least one of {names}")
+
+
+def _target_model(target):
+    model = PRICE_TARGETS.get(target)
+    if model is None:
+        raise BulkOperationError(f"Unknown target '{target}'")
+    return model
+
+
+def _bump_versions(group_ids):
+    """Invalidate caches and in-flight edit forms for every touched group."""
+    group_ids = set(group_ids)
+    PreferenceGroup.objects.filter(id__in=group_ids).bump_version()
+    return group_ids
+
+
+def adjust_prices(target, delta, name=None, group_ids=None):
+    """Add ``delta`` to the price of every matching row, never below zero."""
+    model = _target_model(target)
+    delta = _parse_decimal(delta, "delta")
+    _check_name(name, "name")
+    _require_filter("adjust_price", name=name, group_ids=group_ids)
+
+    qs = model.objects.all()
+    if name is not None:
+        qs = qs.filter(name=name)
+    if group_ids is not None:
+        qs = qs.filter(group_id__in=_check_ids(group_ids, "group_ids"))
+    rows = dict(qs.values_list("id", "group_id"))
+    group_ids = _bump_versions(rows.values())
+    updated = qs.update(
+        price=Greatest(F("price") + delta, Value(Decimal("0")), output_field=DecimalField())
+    )
+    history.record_deltas(history.section_deltas(SECTIONS[target], rows, group_ids))
+    return updated, group_ids
+
+
+def set_rule_flags(flags, column=None, ingredient=None, group_ids=None):
+    """Set boolean flags on every rule matching a column and/or ingredient name."""
+    if not isinstance(flags, dict) or not flags:
+        raise BulkOperationError("'flags' must be a non-empty object")
+    unknown = set(flags) - set(RULE_FLAGS)
+    if unknown:
+        raise BulkOperationError(f"Unknown rule flags: {', '.join(sorted(unknown))}")
+    if not all(isinstance(value, bool) for value in flags.values()):
+        raise BulkOperationError("Rule flag values must be true or false")
+    _check_name(column, "column")
+    _check_name(ingredient, "ingredient")
+    _require_filter("set_rule_flags", column=column, ingredient=ingredient, group_ids=group_ids)
+
+    qs = DependentRule.objects.all()
+    if column is not None:
+        qs = qs.filter(column__name=column)
+    if ingredient is not None:
+        qs = qs.filter(ingredient__name=ingredient)
+    if group_ids is not None:
+        qs = qs.filter(column__group_id__in=_check_ids(group_ids, "group_ids"))
+    group_ids = _bump_versions(qs.order_by().values_list("column__group_id", flat=True).distinct())
+    updated = qs.update(**flags)
+    history.record_deltas(history.rule_deltas(qs, group_ids))
+    return updated, group_ids
+
+
+def reorder(target, group_id, order):
+    """Rewrite ``order_index`` for a group's rows from a list of ids."""
+    model = _target_model(target)
+    if isinstance(group_id, bool) or not isinstance(group_id, int):
+        raise BulkOperationError("'group_id' must be an integer id")
+    if not _check_ids(order, "order"):
+        raise BulkOperationError("'order' must list at least one id")
+
+    positions = Case(
+        *[When(id=obj_id, then=Value(index)) for index, obj_id in enumerate(order)],
+        default=F("order_index"),
+        output_field=PositiveIntegerField(),
+    )
+    group_ids = _bump_versions([group_id])
+    updated = model.objects.filter(group_id=group_id, id__in=order).update(order_index=positions)
+    history.record_changes(group_ids)
+    return updated, group_ids
+
+
+OPERATIONS = {
+    "adjust_price": lambda op: adjust_prices(
+        op.get("target"), op.get("delta"), op.get("name"), op.get("group_ids")
+    ),
+    "set_rule_flags": lambda op: set_rule_flags(
+        op.get("flags"), op.get("column"), op.get("ingredient"), op.get("group_ids")
+    ),
+    "reorder": lambda op: reorder(op.get("target"), op.get("group_id"), op.get("order")),
+}
+
+
+def apply_operations(operations):
+    """Run a batch of operations in one transaction and return affected counts.
+
+    If any operation fails the whole batch is rolled back.
+    """
+    results = []
+    with transaction.atomic():
+        for op in operations:
+            if not isinstance(op, dict):
+                raise BulkOperationError("Each operation must be an object")
+            handler = OPERATIONS.get(op.get("op"))
+            if handler is None:
+                raise BulkOperationError(f"Unknown operation '{op.get('op')}'")
+            updated, _ = handler(op)
+            results.append({"op": op["op"], "updated": updated})
+    return results
@@ -0,0 +1,158 @@
+"""Small in-process caches."""
+import threading
+import time
+from collections import OrderedDict
+
+from .models import PreferenceGroup, CacheGeneration
+from .routers import use_primary
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by the total size of its values.
+
+    ``set`` takes the entry's size explicitly, so callers decide what to count
+    (usually the length of the pre-rendered bytes they store).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, size, version=None):
+        with self._lock:
+            self._store(key, value, size, version)
+
+    def delete(self, key):
+        with self._lock:
+            if self._pop(key):
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def versions(self):
+        with self._lock:
+            return {key: entry[2] for key, entry in self._entries.items()}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+    def _store(self, key, value, size, version):
+        self._pop(key)
+        if size > self.max_size:
+            return
+        self._entries[key] = (value, size, version)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+        return entry is not None
+
+
+class GroupCache(LRUCache):
+    """LRU of per-group values, keyed by group id, kept coherent across workers.
+
+    Changes made in this process are dropped through ``delete``. Changes made by
+    other worker processes are picked up by ``sync``. At most once every
+    ``check_interval`` seconds it reads the shared ``CacheGeneration`` counter.
+    Only when the counter has moved does it compare the cached versions with
+    the database, in one query. Both reads go to the primary: a lagging
+    replica would report the old version and keep the stale entry.
+
+    A value built on a miss may be older than a generation that ``sync`` has
+    already adopted (and revalidated without it). Callers therefore read
+    ``CacheGeneration.current()`` before loading and pass it to ``set``, which
+    drops the value in that case.
+    """
+
+    def __init__(self, max_size, check_interval):
+        super().__init__(max_size)
+        self.check_interval = check_interval
+        self.generation = None
+        self.checks = 0
+        self.revalidations = 0
+        self.stale_builds = 0
+        self._next_check = 0.0
+
+    def set(self, key, value, size, version=None, generation=None):
+        """Store a value loaded after reading ``generation``"""
+        with self._lock:
+            if generation is not None and self.generation is not None and generation < self.generation:
+                self.stale_builds += 1
+                return
+            self._store(key, value, size, version)
+
+    def clear(self):
+        super().clear()
+        # Nothing is cached, so there is no generation to check against
+        self.generation = None
+
+    def sync(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        self.checks += 1
+
+        generation = CacheGeneration.current()
+        # Adopt the generation and snapshot the entries together, so a
+        # concurrent set() either lands in the snapshot or sees the new generation
+        with self._lock:
+            if generation == self.generation:
+                return
+            self.generation = generation
+            cached = {key: entry[2] for key, entry in self._entries.items()}
+        if not cached:
+            return
+        self.revalidations += 1
+        with use_primary():
+            current = dict(PreferenceGroup.objects.filter(id__in=cached).values_list("id", "version"))
+        for group_id, version in cached.items():
+            if current.get(group_id) != version:
+                self.delete(group_id)
+
+    def stats(self):
+        return {
+            **super().stats(),
+            'generation': self.generation,
+            'generation_checks': self.checks,
+            'revalidations': self.revalidations,
+            'stale_builds': self.stale_builds,
+        }
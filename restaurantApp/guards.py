@@ -0,0 +1,92 @@
+"""Size checks for group create/edit submissions.
+
+They run before anything is written, so an oversized or hostile POST costs
+a bounded parse and cannot fill the rule table. Oversized bodies never get
+this far: RequestSizeLimitMiddleware turns them away on their Content-Length.
+"""
+import json
+
+from django.conf import settings
+
+
+class PayloadRejected(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _limit(name, default):
+    return getattr(settings, name, default)
+
+
+def parse_rules(rules_json, limit):
+    """Parse a JSON array of rule objects one element at a time.
+
+    Stops as soon as the array has more than ``limit`` elements. Returns None
+    for missing or malformed JSON, in which case a blank grid is created.
+    """
+    if not rules_json:
+        return None
+
+    decoder = json.JSONDecoder()
+    text = rules_json
+    end = len(text)
+
+    def skip_whitespace(pos):
+        while pos < end and text[pos] in " \t\n\r":
+            pos += 1
+        return pos
+
+    pos = skip_whitespace(0)
+    if pos >= end or text[pos] != "[":
+        return None
+    pos = skip_whitespace(pos + 1)
+
+    rules = []
+    try:
+        if pos < end and text[pos] == "]":
+            return rules
+        while True:
+            rule, pos = decoder.raw_decode(text, pos)
+            if not isinstance(rule, dict):
+                raise PayloadRejected("Each rule must be a JSON object")
+            rules.append(rule)
+            if len(rules) > limit:
+                raise PayloadRejected(f"More than {limit} rules submitted", status=413)
+
+            pos = skip_whitespace(pos)
+            if pos < end and text[pos] == ",":
+                pos = skip_whitespace(pos + 1)
+            elif pos < end and text[pos] == "]":
+                return rules
+            else:
+                return None
+    except json.JSONDecodeError:
+        return None
+
+
+def validate_group_payload(request):
+    """Check a create/edit POST against the configured limits.
+
+    Returns the parsed rules (or None), so the view does not parse them again.
+    The body size itself is checked by RequestSizeLimitMiddleware.
+    """
+    counts = {
+        "preferences": len(request.POST.getlist("preferences[]")),
+        "ingredients": len(request.POST.getlist("ingredients[]")),
+        "columns": len(request.POST.getlist("columns[]")),
+    }
+    limits = {
+        "preferences": _limit("RESTAURANT_MAX_PREFERENCES", 300),
+        "ingredients": _limit("RESTAURANT_MAX_INGREDIENTS", 300),
+        "columns": _limit("RESTAURANT_MAX_COLUMNS", 100),
+    }
+    for name, count in counts.items():
+        if count > limits[name]:
+            raise PayloadRejected(f"At most {limits[name]} {name} are allowed per group", status=413)
+
+    max_cells = _limit("RESTAURANT_MAX_RULE_CELLS", 10000)
+    if counts["ingredients"] * counts["columns"] > max_cells:
+        raise PayloadRejected(f"At most {max_cells} ingredient x column cells are allowed per group", status=413)
+
+    return parse_rules(request.POST.get("rules_json"), max_cells)
@@ -0,0 +1,279 @@
+"""Change log and point-in-time reconstruction of preference groups.
+
+Every save appends a ``GroupChange`` row. Most rows hold a compact delta
+against the previous state; every ``RESTAURANT_SNAPSHOT_INTERVAL`` changes a
+full snapshot is written instead, so rebuilding a group at any moment replays
+at most that many deltas.
+
+Children are recreated on every edit, so states are keyed by position rather
+than by primary key: preferences, ingredients and columns are ordered lists
+and rules are keyed ``"<ingredient position>:<column position>"``.
+
+Groups are serialised and logged in sets, with a constant number of queries
+however many groups a save touched. Bulk updates skip serialisation
+altogether and log the delta they know they made (``record_deltas``).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+    GroupChange,
+)
+
+
+GROUP_FIELDS = (
+    "name", "group_type", "group_option", "min_pref", "max_pref", "pricing_method",
+    "group_price", "multiple_selection_limit", "parent_name", "child_name", "version",
+)
+CHILD_SECTIONS = ("preferences", "ingredients", "columns")
+SECTION_MODELS = {
+    "preferences": Preference,
+    "ingredients": DependentIngredient,
+    "columns": DependentColumn,
+}
+RULE_FLAGS = ("show", "default", "required", "allow_more")
+
+
+def section_rows(section, group_ids):
+    """{group id: [(row id, name, price), ...]} in position order"""
+    rows = defaultdict(list)
+    queryset = SECTION_MODELS[section].objects.select_related(None).filter(group_id__in=group_ids)
+    for group_id, pk, name, price in queryset.order_by("group_id", "order_index", "id").values_list(
+        "group_id", "id", "name", "price"
+    ):
+        rows[group_id].append((pk, name, price))
+    return rows
+
+
+def rule_key(ingredient_pos, column_pos, ingredient_id, column_id):
+    """The position key of a rule, or None if it points outside its group"""
+    if ingredient_id in ingredient_pos and column_id in column_pos:
+        return f"{ingredient_pos[ingredient_id]}:{column_pos[column_id]}"
+    return None
+
+
+def positions(rows):
+    return {pk: i for i, (pk, _, _) in enumerate(rows)}
+
+
+def serialize_groups(group_ids):
+    """Return {group id: full JSON-compatible state} for several groups."""
+    states = {}
+    for values in PreferenceGroup.objects.filter(id__in=group_ids).values("id", *GROUP_FIELDS):
+        group_data = {field: values[field] for field in GROUP_FIELDS}
+        group_data["group_price"] = str(group_data["group_price"])
+        states[values["id"]] = {'group': group_data, 'rules': {}}
+
+    children = {section: section_rows(section, states) for section in CHILD_SECTIONS}
+    for group_id, state in states.items():
+        for section in CHILD_SECTIONS:
+            state[section] = [[name, str(price)] for _, name, price in children[section][group_id]]
+
+    ingredient_pos = {group_id: positions(rows) for group_id, rows in children["ingredients"].items()}
+    column_pos = {group_id: positions(rows) for group_id, rows in children["columns"].items()}
+    rules = DependentRule.objects.select_related(None).filter(ingredient__group_id__in=states).values_list(
+        "ingredient__group_id", "ingredient_id", "column_id", *RULE_FLAGS
+    )
+    for group_id, ing_id, col_id, *flags in rules:
+        key = rule_key(ingredient_pos[group_id], column_pos.get(group_id, {}), ing_id, col_id)
+        if key is not None:
+            states[group_id]['rules'][key] = flags
+    return states
+
+
+def serialize_group(group):
+    """Return the full JSON-compatible state of a group."""
+    return serialize_groups([group.pk])[group.pk]
+
+
+def diff_states(old, new):
+    """Return the delta that turns ``old`` into ``new``."""
+    delta = {}
+
+    changed = {k: v for k, v in new['group'].items() if old['group'].get(k) != v}
+    if changed:
+        delta['group'] = changed
+
+    for section in CHILD_SECTIONS:
+        before, after = old[section], new[section]
+        if before != after:
+            delta[section] = {
+                'length': len(after),
+                'set': {str(i): v for i, v in enumerate(after) if i >= len(before) or before[i] != v},
+            }
+
+    before, after = old['rules'], new['rules']
+    rules_set = {k: v for k, v in after.items() if before.get(k) != v}
+    rules_unset = [k for k in before if k not in after]
+    if rules_set or rules_unset:
+        delta['rules'] = {'set': rules_set, 'unset': rules_unset}
+
+    return delta
+
+
+def apply_delta(state, delta):
+    """Return a new state with ``delta`` applied to ``state``."""
+    state = {
+        'group': {**state['group'], **delta.get('group', {})},
+        **{section: list(state[section]) for section in CHILD_SECTIONS},
+        'rules': dict(state['rules']),
+    }
+    for section in CHILD_SECTIONS:
+        if section in delta:
+            items = state[section][:delta[section]['length']]
+            items.extend([None] * (delta[section]['length'] - len(items)))
+            for i, value in delta[section]['set'].items():
+                items[int(i)] = value
+            state[section] = items
+
+    if 'rules' in delta:
+        for key in delta['rules']['unset']:
+            state['rules'].pop(key, None)
+        state['rules'].update(delta['rules']['set'])
+    return state
+
+
+def _replay(entries):
+    state = None
+    for entry in entries:
+        if entry.kind == "snapshot":
+            state = entry.data
+        elif entry.kind == "deleted":
+            state = None
+        elif state is not None:
+            state = apply_delta(state, entry.data)
+    return state
+
+
+def _last_snapshot(group_ref):
+    return Subquery(
+        GroupChange.objects.filter(group_id=group_ref, kind="snapshot").order_by('-id').values('id')[:1]
+    )
+
+
+def _entries_since_snapshot(group_id, at=None):
+    changes = GroupChange.objects.filter(group_id=group_id)
+    if at is not None:
+        changes = changes.filter(created_at__lte=at)
+
+    snapshot_id = changes.filter(kind="snapshot").order_by('-id').values_list('id', flat=True).first()
+    if snapshot_id is None:
+        return []
+    return list(changes.filter(id__gte=snapshot_id).order_by('id'))
+
+
+def group_at(group_id, at=None):
+    """Rebuild a group's state as of ``at`` (or its latest state), or None if it did not exist."""
+    return _replay(_entries_since_snapshot(group_id, at))
+
+
+def _log_positions(group_ids):
+    """{group id: (version, entries since and including the last snapshot)}, in one query"""
+    since = GroupChange.objects.filter(
+        group_id=OuterRef('id'), id__gte=_last_snapshot(OuterRef(OuterRef('id')))
+    ).order_by().values('group_id').annotate(count=Count('id')).values('count')
+    rows = PreferenceGroup.objects.filter(id__in=group_ids).annotate(
+        since=Coalesce(Subquery(since), 0)
+    ).values_list('id', 'version', 'since')
+    return {group_id: (version, count) for group_id, version, count in rows}
+
+
+def _snapshot_due(count):
+    return count == 0 or count >= getattr(settings, "RESTAURANT_SNAPSHOT_INTERVAL", 20)
+
+
+def record_changes(group_ids):
+    """Append the current state of several groups to the change log.
+
+    Each group gets a delta against its replayed previous state, or a snapshot
+    when it has none yet or its chain reached the snapshot interval. Returns
+    the rows written.
+    """
+    group_ids = list(group_ids)
+    states = serialize_groups(group_ids)
+    entries = defaultdict(list)
+    for entry in GroupChange.objects.filter(
+        group_id__in=states, id__gte=_last_snapshot(OuterRef('group_id'))
+    ).order_by('id'):
+        entries[entry.group_id].append(entry)
+
+    changes = []
+    for group_id, state in states.items():
+        version = state['group']['version']
+        previous = _replay(entries[group_id])
+        if previous is None or _snapshot_due(len(entries[group_id])):
+            changes.append(GroupChange(group_id=group_id, version=version, kind="snapshot", data=state))
+            continue
+        delta = diff_states(previous, state)
+        if delta:
+            changes.append(GroupChange(group_id=group_id, version=version, kind="delta", data=delta))
+    return GroupChange.objects.bulk_create(changes)
+
+
+def record_change(group):
+    """Append the group's current state to the change log; returns the new row or None."""
+    changes = record_changes([group.pk])
+    return changes[0] if changes else None
+
+
+def record_deltas(deltas):
+    """Log deltas a bulk update computed itself, without serialising the groups.
+
+    ``deltas`` maps group ids to deltas in the ``diff_states`` format. Groups
+    that have no snapshot yet or reached the snapshot interval are serialised
+    and get a snapshot instead.
+    """
+    log = _log_positions(list(deltas))
+    snapshots = serialize_groups([group_id for group_id, (_, count) in log.items() if _snapshot_due(count)])
+
+    changes = []
+    for group_id, (version, _) in log.items():
+        if group_id in snapshots:
+            changes.append(GroupChange(group_id=group_id, version=version, kind="snapshot", data=snapshots[group_id]))
+        elif deltas[group_id]:
+            changes.append(GroupChange(
+                group_id=group_id, version=version, kind="delta",
+                data={**deltas[group_id], 'group': {'version': version}},
+            ))
+    return GroupChange.objects.bulk_create(changes)
+
+
+def section_deltas(section, row_ids, group_ids):
+    """Deltas setting the current name and price of the given rows of a section"""
+    rows = section_rows(section, group_ids)
+    return {
+        group_id: {section: {
+            'length': len(rows[group_id]),
+            'set': {
+                str(i): [name, str(price)]
+                for i, (pk, name, price) in enumerate(rows[group_id]) if pk in row_ids
+            },
+        }}
+        for group_id in group_ids
+    }
+
+
+def rule_deltas(rules, group_ids):
+    """Deltas setting the current flags of the rules in a queryset"""
+    ingredient_pos = {group_id: positions(rows) for group_id, rows in section_rows("ingredients", group_ids).items()}
+    column_pos = {group_id: positions(rows) for group_id, rows in section_rows("columns", group_ids).items()}
+    deltas = {group_id: {'rules': {'set': {}, 'unset': []}} for group_id in group_ids}
+    for group_id, ing_id, col_id, *flags in rules.values_list(
+        "column__group_id", "ingredient_id", "column_id", *RULE_FLAGS
+    ):
+        key = rule_key(ingredient_pos.get(group_id, {}), column_pos.get(group_id, {}), ing_id, col_id)
+        if key is not None:
+            deltas[group_id]['rules']['set'][key] = flags
+    return deltas
+
+
+def record_deletion(group):
+    return GroupChange.objects.create(group_id=group.pk, version=group.version, kind="deleted")
@@ -0,0 +1,197 @@
+"""In-process background jobs for long-running menu operations.
+
+Jobs are rows in the ``Job`` table and run on a small thread pool inside the
+web process, so no external broker is needed. Handlers are registered by
+kind with ``@register("kind")`` and receive a ``JobContext`` they use to
+report progress; reporting progress is also where cancellation is noticed.
+
+Because the pool lives in the worker process, a job can be orphaned when the
+process exits: a running job stops reporting progress, and a queued job may
+never have been handed to a pool. ``recover_orphans`` runs at start-up. It
+fails running jobs with no progress for RESTAURANT_JOB_STALE_SECONDS and
+runs their kind's cleanup. It also re-submits queued jobs that old. The
+status endpoint only reports a job as orphaned; cancelling it applies the
+check to that one job. A handler whose job stopped being ``running`` under it
+(failed as orphaned) gets ``JobAbandoned`` at its next progress report, and
+its outcome is not recorded over the row.
+"""
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+from .routers import use_primary
+
+
+_handlers = {}
+_cleanups = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when cancellation of its job was requested."""
+
+
+class JobAbandoned(Exception):
+    """Raised inside a handler whose job is no longer running, e.g. failed as orphaned."""
+
+
+class JobContext:
+    def __init__(self, job):
+        self.job = job
+
+    def progress(self, done, total=None):
+        """Record progress and stop the job if it has been cancelled or abandoned."""
+        fields = {'progress_done': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            fields['progress_total'] = total
+        if not Job.objects.filter(pk=self.job.pk, status="running").update(**fields):
+            raise JobAbandoned()
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def register(kind, cleanup=None):
+    """Register ``func(context, payload)`` as the handler for ``kind`` jobs.
+
+    ``cleanup(payload)`` is called when a job of this kind is found orphaned,
+    to undo whatever the handler had done before its worker stopped.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        if cleanup is not None:
+            _cleanups[kind] = cleanup
+        return func
+    return decorator
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "RESTAURANT_JOB_WORKERS", 2),
+                thread_name_prefix="restaurant-job",
+            )
+        return _executor
+
+
+def _forget_executor():
+    # Pool threads do not survive a fork, e.g. into workers after a preload
+    global _executor
+    _executor = None
+
+
+os.register_at_fork(after_in_child=_forget_executor)
+
+
+def enqueue(kind, payload=None, total=0):
+    """Create a job and start it once the surrounding transaction commits."""
+    if kind not in _handlers:
+        raise ValueError(f"No handler registered for job kind '{kind}'")
+
+    job = Job.objects.create(kind=kind, payload=payload or {}, progress_total=total)
+    transaction.on_commit(lambda: _get_executor().submit(_run, job.pk))
+    return job
+
+
+def cancel(job_id):
+    """Request cancellation. Queued jobs stop immediately, running ones at their next progress report."""
+    Job.objects.filter(pk=job_id, status="queued").update(
+        status="cancelled", cancel_requested=True, finished_at=timezone.now()
+    )
+    return Job.objects.filter(pk=job_id, status="running").update(cancel_requested=True)
+
+
+def run_job(job_id):
+    """Run a queued job in the current thread."""
+    # Claim the job so two workers never run it twice
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status="queued").update(
+        status="running", started_at=now, heartbeat_at=now
+    )
+    if not claimed:
+        return
+
+    job = Job.objects.get(pk=job_id)
+    try:
+        result = _handlers[job.kind](JobContext(job), job.payload)
+    except JobAbandoned:
+        return
+    except JobCancelled:
+        fields = {'status': "cancelled"}
+    except Exception as e:
+        fields = {'status': "failed", 'error': f"{e}\n{traceback.format_exc()}"}
+    else:
+        fields = {'status': "succeeded", 'result': result}
+    # Whoever moved the job out of "running" (orphan recovery) owns its outcome
+    Job.objects.filter(pk=job_id, status="running").update(finished_at=timezone.now(), **fields)
+
+
+def _run(job_id):
+    close_old_connections()
+    try:
+        # Jobs build on writes that replicas may not have received yet
+        with use_primary():
+            run_job(job_id)
+    finally:
+        connections.close_all()
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, "RESTAURANT_JOB_STALE_SECONDS", 300))
+
+
+def _fail_orphan(job):
+    """Fail a running job whose worker stopped, and run its cleanup. Returns whether it was failed."""
+    last_seen = job.heartbeat_at or job.started_at
+    failed = Job.objects.filter(pk=job.pk, status="running", heartbeat_at=job.heartbeat_at).update(
+        status="failed",
+        finished_at=timezone.now(),
+        error=f"Orphaned: the worker running this job stopped (last progress at {last_seen})",
+    )
+    if failed and job.kind in _cleanups:
+        with use_primary():
+            _cleanups[job.kind](job.payload)
+    return bool(failed)
+
+
+def is_orphaned(job):
+    """Whether ``job`` is running without recent progress"""
+    last_seen = job.heartbeat_at or job.started_at
+    return job.status == "running" and (last_seen is None or last_seen < _stale_before())
+
+
+def check_orphaned(job):
+    """Fail ``job`` if it is orphaned; returns the current row"""
+    if is_orphaned(job):
+        _fail_orphan(job)
+        job.refresh_from_db()
+    return job
+
+
+def recover_orphans():
+    """Fail stale running jobs and re-submit stale queued ones; returns (failed, requeued)"""
+    stale_before = _stale_before()
+    failed = 0
+    running = Job.objects.filter(status="running").filter(
+        Q(heartbeat_at__lt=stale_before) | Q(heartbeat_at__isnull=True)
+    )
+    for job in running:
+        failed += _fail_orphan(job)
+
+    requeued = list(
+        Job.objects.filter(status="queued", created_at__lt=stale_before, kind__in=list(_handlers))
+        .values_list("pk", flat=True)
+    )
+    for job_id in requeued:
+        _get_executor().submit(_run, job_id)
+    return failed, len(requeued)
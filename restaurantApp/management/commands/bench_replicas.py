@@ -0,0 +1,160 @@
+import multiprocessing
+import random
+import sqlite3
+import tempfile
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F
+from django.test.utils import override_settings
+
+from restaurantApp import repository
+from restaurantApp.models import PreferenceGroup
+from restaurantApp.routers import ReplicaRouter, use_replica
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure menu read throughput as the number of read replicas grows. "
+        "Reader processes load random groups, one replica per read as in a "
+        "request, while writer processes keep updating the primary. Runs "
+        "against copies of the database; replicas are snapshots of it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-replicas", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=4, help="Reader processes")
+        parser.add_argument("--writers", type=int, default=1, help="Writer processes on the primary")
+        parser.add_argument("--seconds", type=float, default=3.0)
+
+    def handle(self, *args, **options):
+        original = connections.settings["default"]
+        if original["ENGINE"] != "django.db.backends.sqlite3":
+            raise CommandError("The replica benchmark only supports SQLite")
+        if options["readers"] < 1 or options["writers"] < 0 or options["max_replicas"] < 0:
+            raise CommandError("Need at least one reader and no negative counts")
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            raise CommandError("The replica benchmark needs the fork start method")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            primary = directory / "primary.sqlite3"
+            self._copy(original["NAME"], primary)
+            # Writers must not touch the real database
+            self._use_database("default", {**original, "NAME": str(primary)})
+            try:
+                aliases = self._make_replicas(original, primary, directory, options["max_replicas"])
+                group_ids = list(PreferenceGroup.objects.values_list("id", flat=True))
+                if not group_ids:
+                    raise CommandError("The database has no groups; run seed_menu first")
+
+                self.stdout.write(f"{'replicas':>8}  {'reads/s':>10}  {'speedup':>7}  {'writes/s':>9}  reads/s per alias")
+                baseline = None
+                for count in range(options["max_replicas"] + 1):
+                    with override_settings(RESTAURANT_READ_REPLICAS=aliases[:count]):
+                        reads, writes = self._measure(
+                            context, group_ids, options["readers"], options["writers"], options["seconds"]
+                        )
+                    rate = sum(reads.values()) / options["seconds"]
+                    baseline = baseline or rate
+                    per_alias = ", ".join(
+                        f"{alias}={reads[alias] / options['seconds']:.0f}" for alias in sorted(reads)
+                    )
+                    self.stdout.write(
+                        f"{count:>8}  {rate:>10.1f}  {rate / baseline:>6.2f}x  "
+                        f"{writes / options['seconds']:>9.1f}  {per_alias}"
+                    )
+            finally:
+                for alias in list(connections.settings):
+                    if alias.startswith("bench_replica"):
+                        self._use_database(alias, None)
+                self._use_database("default", original)
+
+    def _copy(self, source_path, target_path):
+        source = sqlite3.connect(str(source_path))
+        target = sqlite3.connect(str(target_path))
+        source.backup(target)
+        target.close()
+        source.close()
+
+    def _use_database(self, alias, settings_dict):
+        """Point ``alias`` at ``settings_dict`` (or remove it), dropping any open connection"""
+        if alias in connections:
+            connections[alias].close()
+            del connections[alias]
+        if settings_dict is None:
+            del connections.settings[alias]
+        else:
+            connections.settings[alias] = settings_dict
+
+    def _make_replicas(self, original, primary, directory, count):
+        aliases = []
+        for index in range(1, count + 1):
+            path = directory / f"replica{index}.sqlite3"
+            self._copy(primary, path)
+            alias = f"bench_replica{index}"
+            self._use_database(alias, {
+                **original,
+                "NAME": f"file:{path}?mode=ro",
+                "OPTIONS": {"uri": True},
+            })
+            aliases.append(alias)
+        return aliases
+
+    def _measure(self, context, group_ids, readers, writers, seconds):
+        """Run the processes for ``seconds``; returns ({alias: reads}, writes)"""
+        # Children must not share the parent's sqlite handles
+        connections.close_all()
+        results = context.Queue()
+        barrier = context.Barrier(readers + writers + 1)
+
+        def run(work):
+            random.seed()
+            try:
+                barrier.wait()
+                deadline = time.perf_counter() + seconds
+                results.put(("ok", work(deadline)))
+            except Exception:
+                results.put(("error", traceback.format_exc()))
+            finally:
+                connections.close_all()
+
+        def read(deadline):
+            router = ReplicaRouter()
+            counts = Counter()
+            while time.perf_counter() < deadline:
+                with use_replica():
+                    alias = router.db_for_read(PreferenceGroup)
+                    repository.load_group(random.choice(group_ids))
+                counts[alias] += 1
+            return counts
+
+        def write(deadline):
+            count = 0
+            while time.perf_counter() < deadline:
+                PreferenceGroup.objects.filter(id=random.choice(group_ids)).update(version=F("version") + 1)
+                count += 1
+            return Counter(writes=count)
+
+        processes = [context.Process(target=run, args=(read,)) for _ in range(readers)]
+        processes += [context.Process(target=run, args=(write,)) for _ in range(writers)]
+        for process in processes:
+            process.start()
+        barrier.wait(timeout=60)
+
+        reads, writes = Counter(), 0
+        for _ in processes:
+            status, value = results.get(timeout=seconds + 60)
+            if status == "error":
+                raise CommandError(f"A benchmark process failed:\n{value}")
+            writes += value.pop("writes", 0)
+            reads.update(value)
+        for process in processes:
+            process.join()
+        return reads, writes
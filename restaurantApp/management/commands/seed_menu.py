@@ -0,0 +1,145 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from restaurantApp.models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic catalogue of preference groups for "
+        "benchmarks. --rule-density is the chance that an ingredient x column "
+        "cell gets a rule row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--groups", type=int, default=100)
+        parser.add_argument("--max-ingredients", type=int, default=20)
+        parser.add_argument("--max-columns", type=int, default=5)
+        parser.add_argument("--rule-density", type=float, default=1.0)
+        parser.add_argument("--dependent-ratio", type=float, default=0.5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--prefix", default="Seed")
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not 0 <= options["rule_density"] <= 1:
+            raise CommandError("--rule-density must be between 0 and 1")
+        if options["max_ingredients"] < 1 or options["max_columns"] < 1:
+            raise CommandError("--max-ingredients and --max-columns must be at least 1")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        rng = random.Random(options["seed"])
+        prefix = f"{options['prefix']} {options['seed']}"
+        if PreferenceGroup.objects.filter(name__startswith=f"{prefix}-").exists():
+            raise CommandError(f"Groups named '{prefix}-…' already exist; pick another --seed or --prefix")
+
+        self.batch_size = options["batch_size"]
+        self.counts = dict.fromkeys(("groups", "preferences", "ingredients", "columns", "rules"), 0)
+        self.pending_rules = []
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            for first in range(0, options["groups"], 1000):
+                count = min(1000, options["groups"] - first)
+                self._seed_chunk(rng, prefix, first, count, options)
+            self._flush_rules(force=True)
+
+        elapsed = time.perf_counter() - start
+        summary = ", ".join(f"{count} {name}" for name, count in self.counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Created {summary} in {elapsed:.1f}s"))
+
+    def _price(self, rng):
+        return f"{rng.randrange(0, 500) / 100:.2f}"
+
+    def _insert(self, model, fields, rows):
+        """executemany straight into the model's table, skipping model instances"""
+        if not rows:
+            return
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(name).column for name in fields]
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            quote(model._meta.db_table),
+            ", ".join(quote(column) for column in columns),
+            ", ".join(["%s"] * len(columns)),
+        )
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(sql, rows[start:start + self.batch_size])
+
+    def _seed_chunk(self, rng, prefix, first, count, options):
+        specs = []
+        for index in range(first, first + count):
+            dependent = rng.random() < options["dependent_ratio"]
+            specs.append(PreferenceGroup(
+                name=f"{prefix}-{index}",
+                group_type="Dependent" if dependent else "Independent",
+                group_option="N/A" if dependent else rng.choice(["optional", "required", "multiple"]),
+                pricing_method="No Charge" if dependent else rng.choice(
+                    ["No Charge", "Group Pricing", "Individual Pricing"]
+                ),
+                group_price=self._price(rng),
+                min_pref=1,
+                max_pref=rng.randint(1, 10),
+            ))
+        groups = PreferenceGroup.objects.bulk_create(specs)
+        self.counts["groups"] += len(groups)
+
+        child_fields = ("group", "name", "price", "order_index")
+        preferences, ingredients, columns = [], [], []
+        dependent_ids = []
+        for group in groups:
+            if group.group_type == "Independent":
+                for i in range(rng.randint(1, options["max_ingredients"])):
+                    preferences.append((group.id, f"Option {i}", self._price(rng), i))
+            else:
+                dependent_ids.append(group.id)
+                for i in range(rng.randint(1, options["max_ingredients"])):
+                    ingredients.append((group.id, f"Ingredient {i}", self._price(rng), i))
+                for i in range(rng.randint(1, options["max_columns"])):
+                    columns.append((group.id, f"Column {i}", self._price(rng), i))
+
+        self._insert(Preference, child_fields, preferences)
+        self._insert(DependentIngredient, child_fields, ingredients)
+        self._insert(DependentColumn, child_fields, columns)
+        self.counts["preferences"] += len(preferences)
+        self.counts["ingredients"] += len(ingredients)
+        self.counts["columns"] += len(columns)
+
+        columns_by_group = {}
+        for column_id, group_id in DependentColumn.objects.filter(
+            group_id__in=dependent_ids
+        ).order_by("id").values_list("id", "group_id"):
+            columns_by_group.setdefault(group_id, []).append(column_id)
+
+        density = options["rule_density"]
+        for ingredient_id, group_id in DependentIngredient.objects.filter(
+            group_id__in=dependent_ids
+        ).order_by("id").values_list("id", "group_id"):
+            for column_id in columns_by_group[group_id]:
+                if density < 1 and rng.random() >= density:
+                    continue
+                flags = rng.random()
+                self.pending_rules.append(
+                    (ingredient_id, column_id, flags < 0.7, flags < 0.1, flags < 0.2, flags < 0.05)
+                )
+            self._flush_rules()
+
+    def _flush_rules(self, force=False):
+        if self.pending_rules and (force or len(self.pending_rules) >= self.batch_size):
+            self._insert(
+                DependentRule,
+                ("ingredient", "column", "show", "default", "allow_more", "required"),
+                self.pending_rules,
+            )
+            self.counts["rules"] += len(self.pending_rules)
+            self.pending_rules = []
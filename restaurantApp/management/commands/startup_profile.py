@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Runs in a fresh interpreter so nothing is already imported or warmed
+MEASURE_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+loaded = time.perf_counter()
+
+from django.urls import get_resolver, resolve, reverse
+get_resolver().url_patterns
+resolve(reverse("group_list"))
+resolved = time.perf_counter()
+
+from django.test import Client
+client = Client()
+latencies = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    client.get(reverse("group_list"))
+    latencies.append(time.perf_counter() - t)
+
+print(json.dumps({
+    "load": loaded - start,
+    "resolver": resolved - loaded,
+    "requests": latencies,
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """Return (module, self_us, cumulative_us) for each line of -X importtime output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Report import time, URL resolver warm-up and first-request latency of the app entry points"
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=["wsgi", "asgi"], default="wsgi")
+        parser.add_argument("--top", type=int, default=20, help="Number of slowest modules to list")
+        parser.add_argument("--requests", type=int, default=5)
+
+    def handle(self, *args, **options):
+        module = f"restaurant.{options['target']}"
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "restaurant.settings")}
+
+        imports = self._run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env)
+        rows = parse_importtime(imports.stderr)
+        self._report_imports(module, rows, options["top"])
+
+        for warm in ("0", "1"):
+            result = self._run(
+                [sys.executable, "-c", MEASURE_SCRIPT, module, str(options["requests"])],
+                {**env, "RESTAURANT_WARM_UP": warm},
+            )
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            self._report_requests("with warm-up" if warm == "1" else "without warm-up", timings)
+
+    def _run(self, command, env):
+        result = subprocess.run(command, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return result
+
+    def _report_imports(self, module, rows, top):
+        total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+        self.stdout.write(f"Importing {module}: {total / 1000:.1f} ms\n")
+
+        self.stdout.write(f"{'self ms':>9}  {'cumul ms':>9}  module")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda row: row[1], reverse=True)[:top]:
+            self.stdout.write(f"{self_us / 1000:>9.1f}  {cumulative_us / 1000:>9.1f}  {name}")
+
+        packages = defaultdict(int)
+        for name, self_us, _ in rows:
+            packages[name.split(".")[0]] += self_us
+        self.stdout.write(f"\n{'self ms':>9}  package")
+        for name, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+            self.stdout.write(f"{self_us / 1000:>9.1f}  {name}")
+
+    def _report_requests(self, label, timings):
+        first, *rest = timings["requests"]
+        steady = sorted(rest)[len(rest) // 2] if rest else first
+        self.stdout.write(
+            f"\n{label}: load {timings['load'] * 1000:.1f} ms, "
+            f"URL resolver {timings['resolver'] * 1000:.1f} ms, "
+            f"first request {first * 1000:.1f} ms, "
+            f"median after {steady * 1000:.1f} ms ({first / steady:.1f}x)"
+        )
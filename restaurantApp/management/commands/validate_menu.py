@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurantApp.validation import validate_database, validate_menu
+
+
+class Command(BaseCommand):
+    help = (
+        "Check a menu for inconsistent groups: min/max preferences, flags on "
+        "hidden cells, duplicate names and out-of-range rule indexes. Reads a "
+        "JSON list of groups, or the database when no file is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="JSON file with a list of groups")
+        parser.add_argument("--workers", type=int, help=(
+            "Worker processes for the database, each loading its own ranges of "
+            "groups (default RESTAURANT_VALIDATION_WORKERS); a file is always "
+            "checked in this process"
+        ))
+        parser.add_argument("--chunk-size", type=int, help="Groups per range a worker loads")
+        parser.add_argument("--json", action="store_true", help="Print the errors as JSON")
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] is not None and options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        start = time.perf_counter()
+        if options["path"]:
+            try:
+                with open(options["path"]) as f:
+                    groups = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                raise CommandError(f"Could not read {options['path']}: {e}")
+            if isinstance(groups, dict):
+                groups = groups.get("groups")
+            if not isinstance(groups, list) or not all(isinstance(group, dict) for group in groups):
+                raise CommandError("The menu must be a JSON list of group objects")
+            errors, count = validate_menu(groups), len(groups)
+        else:
+            errors, count = validate_database(workers=options["workers"], chunk_size=options["chunk_size"])
+        elapsed = time.perf_counter() - start
+
+        if options["json"]:
+            self.stdout.write(json.dumps(errors, indent=2))
+        else:
+            for error in errors:
+                self.stdout.write(f"#{error['group']} {error['name']!r}: {error['message']}")
+
+        summary = f"Checked {count} groups in {elapsed:.2f}s: {len(errors)} errors"
+        if errors:
+            raise CommandError(summary)
+        self.stderr.write(self.style.SUCCESS(summary))
@@ -0,0 +1,146 @@
+"""Customer-facing menu view models.
+
+A group's view model holds only what a customer sees: visible ingredient x
+column cells with resolved prices, pre-checked defaults and required
+markers. It is built once per group version, serialised to JSON and rendered
+to an HTML fragment, and kept in a size-bounded LRU. Serving a warm entry
+needs no database queries, apart from the shared generation check that
+``GroupCache.sync`` makes at most once per RESTAURANT_CACHE_CHECK_INTERVAL.
+Entries are dropped when ``groups_changed`` fires or the group is deleted.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+
+from . import repository
+from .cache import GroupCache
+from .models import PreferenceGroup, CacheGeneration
+from .pricing import preference_price
+from .routers import use_primary
+from .signals import groups_changed
+
+
+menu_cache = GroupCache(
+    getattr(settings, "RESTAURANT_MENU_CACHE_BYTES", 16 * 1024 * 1024),
+    getattr(settings, "RESTAURANT_CACHE_CHECK_INTERVAL", 0.5),
+)
+
+
+class CompiledMenu:
+    def __init__(self, group_id, version, data):
+        self.group_id = group_id
+        self.version = version
+        self.data = data
+        self.json = json.dumps(data, separators=(",", ":")).encode()
+        self.html = render_to_string("menu_group.html", {"menu": data, "grid": _grid(data)})
+
+    @property
+    def etag(self):
+        return PreferenceGroup.make_etag(self.group_id, self.version)
+
+    @property
+    def size(self):
+        return len(self.json) + len(self.html)
+
+
+def _price(value):
+    return str(Decimal(value).quantize(Decimal("0.01")))
+
+
+def build_menu_data(loaded):
+    """Build the customer view model of a group loaded by ``repository.load_group``"""
+    group = loaded.group
+    data = {
+        "id": group.id,
+        "name": group.name,
+        "type": group.group_type,
+        "version": group.version,
+        "required": group.group_option == "required",
+        "multiple": group.group_option == "multiple",
+    }
+
+    if group.group_type == "Independent":
+        data.update({
+            "min": group.min_pref,
+            "max": group.max_pref,
+            "pricing_method": group.pricing_method,
+            "preferences": [
+                {
+                    "name": pref.name,
+                    "price": _price(preference_price(group.pricing_method, group.group_price, pref.price)),
+                }
+                for pref in loaded.preferences
+            ],
+        })
+        return data
+
+    rows_shown, columns_shown, cells = loaded.visible_grid()
+    rows = []
+    for ingredient in rows_shown:
+        row_cells = []
+        # Columns are referred to by their position among the visible columns
+        for position, column in enumerate(columns_shown):
+            rule = cells.get((ingredient.id, column.id))
+            if rule is None:
+                continue
+            row_cells.append({
+                "column": position,
+                "price": _price(ingredient.price + column.price),
+                "default": rule.default,
+                "required": rule.required,
+                "allow_more": rule.allow_more,
+            })
+        rows.append({"name": ingredient.name, "price": _price(ingredient.price), "cells": row_cells})
+
+    data.update({
+        "row_label": group.child_name,
+        "column_label": group.parent_name,
+        "columns": [{"name": column.name, "price": _price(column.price)} for column in columns_shown],
+        "rows": rows,
+    })
+    return data
+
+
+def _grid(data):
+    """Rows with one slot per visible column (None where the cell is hidden), for the HTML table"""
+    grid = []
+    for row in data.get("rows", []):
+        slots = [None] * len(data["columns"])
+        for cell in row["cells"]:
+            slots[cell["column"]] = cell
+        grid.append({"name": row["name"], "cells": slots})
+    return grid
+
+
+def get_menu(group_id):
+    """Return the compiled menu of a group, building it on a cache miss.
+
+    Raises PreferenceGroup.DoesNotExist for unknown groups. Misses are built
+    from the primary, so a lagging replica cannot cache an old version.
+    """
+    menu_cache.sync()
+    menu = menu_cache.get(group_id)
+    if menu is None:
+        with use_primary():
+            generation = CacheGeneration.current()
+            loaded = repository.load_group(group_id)
+        group = loaded.group
+        menu = CompiledMenu(group.id, group.version, build_menu_data(loaded))
+        menu_cache.set(group_id, menu, menu.size, group.version, generation)
+    return menu
+
+
+@receiver(groups_changed)
+def _invalidate_changed(sender, group_ids, **kwargs):
+    for group_id in group_ids:
+        menu_cache.delete(group_id)
+
+
+@receiver(post_delete, sender=PreferenceGroup)
+def _invalidate_deleted(sender, instance, **kwargs):
+    CacheGeneration.bump()
+    menu_cache.delete(instance.id)
@@ -0,0 +1,104 @@
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseBadRequest
+
+from .profiling import RequestProfile
+from .routers import use_primary, use_replica
+
+
+PIN_SESSION_KEY = "_restaurant_primary_until"
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class RequestSizeLimitMiddleware:
+    """Reject bodies over RESTAURANT_MAX_REQUEST_BYTES with 413.
+
+    Goes before CsrfViewMiddleware, the first middleware to read the body, so
+    the Content-Length header is checked before any of the body is parsed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = getattr(settings, "RESTAURANT_MAX_REQUEST_BYTES", 2_621_440)
+
+    def __call__(self, request):
+        try:
+            length = int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid Content-Length")
+        if length > self.limit:
+            return HttpResponse(f"Request body is larger than {self.limit} bytes", status=413)
+        return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Pin a session's reads to the primary for a while after it writes.
+
+    Write requests always run against the primary, and the session is then
+    pinned for RESTAURANT_REPLICA_PIN_SECONDS so the redirect that follows a
+    save (and anything else the user loads right after) reads its own writes.
+    Other requests read from a single replica picked for the request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, "session", None)
+        is_write = request.method in WRITE_METHODS
+        pinned = is_write or (session is not None and session.get(PIN_SESSION_KEY, 0) > time.time())
+
+        if not pinned:
+            with use_replica():
+                return self.get_response(request)
+
+        with use_primary():
+            response = self.get_response(request)
+
+        if is_write and session is not None:
+            session[PIN_SESSION_KEY] = time.time() + getattr(settings, "RESTAURANT_REPLICA_PIN_SECONDS", 5)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests, or one request on demand.
+
+    Only installed when RESTAURANT_PROFILING is on. A fraction
+    RESTAURANT_PROFILE_SAMPLE_RATE of requests is profiled and merged per
+    view. Staff users can also send the RESTAURANT_PROFILE_HEADER header to
+    profile one request; the response then carries an X-Profile-Id to fetch
+    it with.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "RESTAURANT_PROFILING", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "RESTAURANT_PROFILE_SAMPLE_RATE", 0.0)
+        self.header = "HTTP_" + getattr(settings, "RESTAURANT_PROFILE_HEADER", "X-Profile").upper().replace("-", "_")
+
+    def __call__(self, request):
+        on_demand = self.header in request.META and request.user.is_staff
+        sampled = random.random() < self.sample_rate
+        if not (on_demand or sampled):
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        try:
+            profile.start()
+        except ValueError:
+            # Another profiler already owns this interpreter (Python 3.12+)
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+
+        match = request.resolver_match
+        profile.record_view(match.view_name if match else "unresolved")
+        if on_demand:
+            response["X-Profile-Id"] = profile.record_request()
+        return response
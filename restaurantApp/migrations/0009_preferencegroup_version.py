@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantApp', '0008_alter_preferencegroup_group_option'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='preferencegroup',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantApp', '0010_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('group_id', models.PositiveBigIntegerField()),
+                ('version', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('snapshot', 'Snapshot'), ('delta', 'Delta'), ('deleted', 'Deleted')], max_length=10)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['group_id', 'created_at'], name='restaurantA_group_i_f802a5_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantApp', '0011_groupchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='preferencegroup',
+            index=models.Index(fields=['group_type'], name='restaurantA_group_t_aecbce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='preferencegroup',
+            index=models.Index(fields=['-created_at'], name='restaurantA_created_20fb7c_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:13
+
+from django.db import migrations, models
+
+
+def create_generation_row(apps, schema_editor):
+    apps.get_model('restaurantApp', 'CacheGeneration').objects.create(pk=1, value=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantApp', '0012_preferencegroup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_generation_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantApp', '0014_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='preferencegroup',
+            index=models.Index(fields=['pricing_method'], name='restaurantA_pricing_62476b_idx'),
+        ),
+    ]
@@ -1,4 +1,56 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+from .signals import groups_changed
+
+
+class PreferenceGroupQuerySet(models.QuerySet):
+    def bump_version(self, **fields):
+        """Update the groups, increment their versions and announce the change on commit"""
+        group_ids = list(self.values_list("id", flat=True))
+        updated = self.update(version=models.F("version") + 1, **fields)
+        if updated:
+            CacheGeneration.bump()
+            transaction.on_commit(
+                lambda: groups_changed.send(sender=PreferenceGroup, group_ids=group_ids)
+            )
+        return updated
+
+    def for_list(self):
+        """Only the columns shown on the group list page"""
+        return self.only(
+            "id", "name", "group_type", "group_option", "pricing_method",
+            "min_pref", "max_pref", "created_at",
+        )
+
+
+class GroupChildQuerySet(models.QuerySet):
+    def for_edit(self):
+        """Rows of a known group; the group itself is not joined"""
+        return self.select_related(None).only("id", "group_id", "name", "price", "order_index")
+
+
+class GroupChildManager(models.Manager.from_queryset(GroupChildQuerySet)):
+    """Joins the parent group so __str__ does not issue a query per row"""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("group")
+
+
+class DependentRuleQuerySet(models.QuerySet):
+    def for_matrix(self):
+        """Just the foreign keys and flags needed to draw the rules matrix"""
+        return self.select_related(None).only(
+            "id", "ingredient_id", "column_id", "show", "default", "required", "allow_more",
+        )
+
+
+class DependentRuleManager(models.Manager.from_queryset(DependentRuleQuerySet)):
+    """Joins the ingredient and column so __str__ does not issue queries per row"""
+
+    def get_queryset(self):
+        return super().get_queryset().select_related("ingredient", "column")
+
 
 class PreferenceGroup(models.Model):
     TYPE_CHOICES = [
@@ -29,10 +81,29 @@ class PreferenceGroup(models.Model):
     parent_name = models.CharField(max_length=100, default="Add Column")
     child_name = models.CharField(max_length=100, default="Add Row")
     created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=1)
+
+    objects = PreferenceGroupQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['group_type']),
+            models.Index(fields=['pricing_method']),
+            models.Index(fields=['-created_at']),
+        ]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def make_etag(pk, version):
+        """ETag of every response that renders this version of a group"""
+        return f'"{pk}-{version}"'
+
+    @property
+    def etag(self):
+        return self.make_etag(self.pk, self.version)
+
     def get_preferences_count(self):
         return self.preferences.count()
     
@@ -49,6 +120,8 @@ class Preference(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     order_index = models.PositiveIntegerField(default=0)
 
+    objects = GroupChildManager()
+
     class Meta:
         ordering = ['order_index']
 
@@ -62,6 +135,8 @@ class DependentIngredient(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     order_index = models.PositiveIntegerField(default=0)
 
+    objects = GroupChildManager()
+
     class Meta:
         ordering = ['order_index']
 
@@ -75,6 +150,8 @@ class DependentColumn(models.Model):
     price = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     order_index = models.PositiveIntegerField(default=0)
 
+    objects = GroupChildManager()
+
     class Meta:
         ordering = ['order_index']
 
@@ -90,8 +167,98 @@ class DependentRule(models.Model):
     allow_more = models.BooleanField(default=False)
     required = models.BooleanField(default=False)
 
+    objects = DependentRuleManager()
+
     class Meta:
         unique_together = ('ingredient', 'column')
 
     def __str__(self):
-        return f"Rule({self.ingredient.name} x {self.column.name})"
\ No newline at end of file
+        return f"Rule({self.ingredient.name} x {self.column.name})"
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("succeeded", "Succeeded"),
+        ("failed", "Failed"),
+        ("cancelled", "Cancelled"),
+    ]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued", db_index=True)
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    progress_done = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Job #{self.pk} {self.kind} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': {'done': self.progress_done, 'total': self.progress_total},
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class GroupChange(models.Model):
+    """Append-only history of preference group saves.
+
+    ``group_id`` is a plain column rather than a foreign key so history
+    survives the group being deleted.
+    """
+    KIND_CHOICES = [
+        ("snapshot", "Snapshot"),
+        ("delta", "Delta"),
+        ("deleted", "Deleted"),
+    ]
+
+    group_id = models.PositiveBigIntegerField()
+    version = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [models.Index(fields=['group_id', 'created_at'])]
+
+    def __str__(self):
+        return f"{self.kind} of group {self.group_id} v{self.version}"
+
+
+class CacheGeneration(models.Model):
+    """Counter bumped with every group change so other worker processes can
+    tell cheaply whether their in-process caches may be stale."""
+    value = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def bump(cls):
+        # The single row is created by the migration
+        cls.objects.filter(pk=1).update(value=models.F("value") + 1)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list("value", flat=True).first() or 0
@@ -0,0 +1,164 @@
+"""Exact group pricing in integer cents.
+
+Submitted prices are parsed with ``parse_price`` into two-place Decimals, the
+same values the price columns store. A group's ``PriceTable`` holds the
+resolved price of every preference and of every visible ingredient x column
+cell, in cents, in flat ``array`` objects laid out like the menu JSON. It is
+built once per group version and kept in a ``GroupCache``, so pricing a
+selection is indexing and an integer sum.
+"""
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from . import repository
+from .cache import GroupCache
+from .models import PreferenceGroup, CacheGeneration
+from .routers import use_primary
+from .signals import groups_changed
+
+
+CENT = Decimal("0.01")
+# Largest value the price columns (max_digits=8, decimal_places=2) can hold
+MAX_PRICE = Decimal("999999.99")
+
+price_tables = GroupCache(
+    getattr(settings, "RESTAURANT_PRICE_CACHE_BYTES", 4 * 1024 * 1024),
+    getattr(settings, "RESTAURANT_CACHE_CHECK_INTERVAL", 0.5),
+)
+
+
+def parse_price(value):
+    """Parse a submitted price into a Decimal with two places; blank is zero.
+
+    Raises ValueError for anything that is not a finite number the price
+    columns can store.
+    """
+    if value is None or not str(value).strip():
+        return Decimal("0.00")
+    try:
+        price = Decimal(str(value).strip())
+        if not price.is_finite():
+            raise ValueError
+        price = price.quantize(CENT, rounding=ROUND_HALF_UP)
+    except (ArithmeticError, ValueError):
+        raise ValueError(f"Invalid price: {value!r}")
+    if abs(price) > MAX_PRICE:
+        raise ValueError(f"Price {value!r} is outside -{MAX_PRICE} to {MAX_PRICE}")
+    return price
+
+
+def to_cents(value):
+    return int((Decimal(value) * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    whole, part = divmod(abs(cents), 100)
+    return f"{sign}{whole}.{part:02d}"
+
+
+def preference_price(pricing_method, group_price, price):
+    """What one selected preference costs under the group's pricing method"""
+    if pricing_method == "Individual Pricing":
+        return price
+    if pricing_method == "Group Pricing":
+        return group_price
+    return Decimal("0")
+
+
+class PriceTable:
+    """Resolved prices of one version of a group, in cents.
+
+    ``preferences[i]`` is the i-th preference. Cells use the menu's
+    coordinates: ``row`` and ``column`` count only the rows and columns that
+    have a visible cell, as in the menu JSON. The cell at (row, column) is
+    ``cells[row * column_count + column]`` and costs the ingredient's price
+    plus the column's; hidden cells cannot be priced.
+    """
+
+    def __init__(self, group_id, version, preferences=(), ingredients=(), columns=(), hidden=()):
+        self.group_id = group_id
+        self.version = version
+        self.preferences = array("q", preferences)
+        self.row_count = len(ingredients)
+        self.column_count = len(columns)
+        self.cells = array("q", (row + column for row in ingredients for column in columns))
+        self.hidden = frozenset(row * self.column_count + column for row, column in hidden)
+
+    @property
+    def size(self):
+        return (len(self.preferences) + len(self.cells) + len(self.hidden)) * self.cells.itemsize
+
+    def cell(self, row, column):
+        if not (0 <= row < self.row_count and 0 <= column < self.column_count):
+            raise IndexError(f"No cell at ({row}, {column})")
+        index = row * self.column_count + column
+        if index in self.hidden:
+            raise IndexError(f"Cell ({row}, {column}) is not on the menu")
+        return self.cells[index]
+
+    def total(self, preferences=(), cells=()):
+        """Total in cents of the given preference indexes and (row, column) cells"""
+        total = 0
+        for index in preferences:
+            if not 0 <= index < len(self.preferences):
+                raise IndexError(f"No preference at {index}")
+            total += self.preferences[index]
+        for row, column in cells:
+            total += self.cell(row, column)
+        return total
+
+
+def build_price_table(loaded):
+    """Build the price table of a group loaded by ``repository.load_group``"""
+    group = loaded.group
+    rows, columns, shown = loaded.visible_grid()
+    return PriceTable(
+        group.id,
+        group.version,
+        preferences=[
+            to_cents(preference_price(group.pricing_method, group.group_price, preference.price))
+            for preference in loaded.preferences
+        ],
+        ingredients=[to_cents(ingredient.price) for ingredient in rows],
+        columns=[to_cents(column.price) for column in columns],
+        hidden=[
+            (row, column)
+            for row, ingredient in enumerate(rows)
+            for column, col in enumerate(columns)
+            if (ingredient.id, col.id) not in shown
+        ],
+    )
+
+
+def get_price_table(group_id):
+    """Return the price table of a group, building it on a cache miss.
+
+    Raises PreferenceGroup.DoesNotExist for unknown groups. Like menus, misses
+    are built from the primary.
+    """
+    price_tables.sync()
+    table = price_tables.get(group_id)
+    if table is None:
+        with use_primary():
+            generation = CacheGeneration.current()
+            loaded = repository.load_group(group_id)
+        table = build_price_table(loaded)
+        price_tables.set(group_id, table, table.size, table.version, generation)
+    return table
+
+
+@receiver(groups_changed)
+def _invalidate_changed(sender, group_ids, **kwargs):
+    for group_id in group_ids:
+        price_tables.delete(group_id)
+
+
+@receiver(post_delete, sender=PreferenceGroup)
+def _invalidate_deleted(sender, instance, **kwargs):
+    # menu's receiver already bumps the shared generation for deletions
+    price_tables.delete(instance.id)
@@ -0,0 +1,197 @@
+"""Opt-in request profiling.
+
+A profiled request runs under ``cProfile`` while a shared background thread
+samples its Python stack every ``RESTAURANT_PROFILE_INTERVAL`` seconds.
+Results are merged per view. They can be downloaded as pstats files for
+``python -m pstats``/snakeviz, or as collapsed stacks for flamegraph.pl and
+speedscope.
+
+Merged view profiles live in the memory of the worker that served the
+requests, so with several workers each reports only its own share. On-demand
+profiles of single requests are written to ``RESTAURANT_PROFILE_DIR``, which
+every worker on the host reads, so an ``X-Profile-Id`` can be fetched from
+any of them. The last ``RESTAURANT_PROFILE_KEEP`` are kept.
+
+cProfile and pstats are only imported once a request is profiled.
+"""
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+
+_lock = threading.Lock()
+_views = {}
+_sampler = None
+PROFILE_ID = re.compile(r"[0-9a-f]{32}")
+
+
+class ProfileResult:
+    def __init__(self):
+        self.count = 0
+        self.stats = None
+        self.stacks = Counter()
+
+    def add(self, profiler, stacks):
+        import pstats
+
+        self.count += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(profiler)
+        else:
+            self.stats.add(profiler)
+        self.stacks.update(stacks)
+
+    def pstats_bytes(self):
+        """The same bytes ``pstats.Stats.dump_stats`` writes to a file"""
+        import marshal
+
+        return marshal.dumps(self.stats.stats if self.stats else {})
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class StoredProfile:
+    """A single-request profile read back from ``RESTAURANT_PROFILE_DIR``"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def pstats_bytes(self):
+        return self.path.with_suffix(".pstats").read_bytes()
+
+    def collapsed(self):
+        return self.path.with_suffix(".collapsed").read_text()
+
+
+class StackSampler(threading.Thread):
+    """Sample the stacks of threads that are serving profiled requests"""
+
+    def __init__(self, interval):
+        super().__init__(name="restaurant-profiler", daemon=True)
+        self.interval = interval
+        self.active = {}
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in list(self.active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_filename}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _get_sampler():
+    global _sampler
+    with _lock:
+        if _sampler is None:
+            _sampler = StackSampler(getattr(settings, "RESTAURANT_PROFILE_INTERVAL", 0.005))
+            _sampler.start()
+        return _sampler
+
+
+class RequestProfile:
+    """Profile the current thread between ``start()`` and ``stop()``"""
+
+    def start(self):
+        import cProfile
+
+        self.stacks = Counter()
+        self.sampler = _get_sampler()
+        self.sampler.active[threading.get_ident()] = self.stacks
+        self.profiler = cProfile.Profile()
+        try:
+            self.profiler.enable()
+        except ValueError:
+            self.sampler.active.pop(threading.get_ident(), None)
+            raise
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.active.pop(threading.get_ident(), None)
+
+    def record_view(self, view_name):
+        with _lock:
+            _views.setdefault(view_name, ProfileResult()).add(self.profiler, self.stacks)
+
+    def record_request(self):
+        """Store this request's profile on its own and return its id"""
+        result = ProfileResult()
+        result.add(self.profiler, self.stacks)
+        profile_id = uuid.uuid4().hex
+        directory = _profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write under a temporary name so other workers never read half a file
+        for suffix, data in ((".collapsed", result.collapsed().encode()), (".pstats", result.pstats_bytes())):
+            partial = directory / f"{profile_id}{suffix}.partial"
+            partial.write_bytes(data)
+            os.replace(partial, directory / f"{profile_id}{suffix}")
+        _prune(directory, getattr(settings, "RESTAURANT_PROFILE_KEEP", 20))
+        return profile_id
+
+
+def _profile_dir():
+    return Path(getattr(settings, "RESTAURANT_PROFILE_DIR", None) or Path(tempfile.gettempdir()) / "restaurant-profiles")
+
+
+def _stored_profiles(directory):
+    """Stored profiles, oldest first"""
+    profiles = []
+    for path in directory.glob("*.pstats"):
+        try:
+            profiles.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            pass
+    return [path for _, path in sorted(profiles)]
+
+
+def _prune(directory, keep):
+    stored = _stored_profiles(directory)
+    for path in stored[:max(len(stored) - keep, 0)]:
+        for suffix in (".pstats", ".collapsed"):
+            path.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def view_summary():
+    with _lock:
+        return {name: result.count for name, result in _views.items()}
+
+
+def get_view_result(view_name):
+    with _lock:
+        return _views.get(view_name)
+
+
+def get_request_result(profile_id):
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    path = _profile_dir() / f"{profile_id}.pstats"
+    return StoredProfile(path) if path.exists() else None
+
+
+def reset():
+    with _lock:
+        _views.clear()
+    directory = _profile_dir()
+    if directory.exists():
+        _prune(directory, 0)
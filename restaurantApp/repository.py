@@ -0,0 +1,172 @@
+"""Loading whole preference groups.
+
+``list_groups``, ``recent_group_ids`` and ``get_group`` read group rows on
+their own. ``load_group`` returns a group together with the children its type
+uses:
+preferences for Independent groups; ingredients, columns and rules for
+Dependent ones. On SQLite everything comes back in one round trip. The group
+row carries a JSON annotation built with ``json_group_array`` subqueries,
+and a CASE on ``group_type`` keeps SQLite from evaluating the subqueries of
+the other type. Other databases fall back to one query per child table.
+
+Children are ordered by ``order_index``. Each has its ``group`` (and each rule
+its ``ingredient`` and ``column``) already attached, so nothing downstream
+queries again.
+"""
+import json
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+from .models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+)
+
+
+# In model field order, which is the order Model.from_db expects values in
+CHILD_FIELDS = ("id", "name", "price", "order_index")
+RULE_FIELDS = ("id", "ingredient_id", "column_id", "show", "default", "allow_more", "required")
+CENT = Decimal("0.01")
+
+
+class LoadedGroup:
+    def __init__(self, group, preferences=(), ingredients=(), columns=(), rules=()):
+        self.group = group
+        self.preferences = list(preferences)
+        self.ingredients = list(ingredients)
+        self.columns = list(columns)
+        self.rules = list(rules)
+
+    def rules_by_ingredient(self):
+        """{ingredient id: {column id: rule}}"""
+        matrix = {ingredient.id: {} for ingredient in self.ingredients}
+        for rule in self.rules:
+            matrix[rule.ingredient_id][rule.column_id] = rule
+        return matrix
+
+    def visible_grid(self):
+        """The grid customers see: ``(rows, columns, shown)``.
+
+        ``rows`` and ``columns`` are the ingredients and columns with at least
+        one shown cell, in order; ``shown`` maps (ingredient id, column id) to
+        the rule of each shown cell. Menus and price tables both index cells
+        by position in these lists.
+        """
+        shown = {(rule.ingredient_id, rule.column_id): rule for rule in self.rules if rule.show}
+        row_ids = {ingredient_id for ingredient_id, _ in shown}
+        column_ids = {column_id for _, column_id in shown}
+        rows = [ingredient for ingredient in self.ingredients if ingredient.id in row_ids]
+        columns = [column for column in self.columns if column.id in column_ids]
+        return rows, columns, shown
+
+
+def list_groups():
+    """Group rows for the list page, newest first, without their children"""
+    return PreferenceGroup.objects.for_list().order_by("-created_at")
+
+
+def recent_group_ids(count):
+    """Ids of the ``count`` most recently created groups"""
+    return list(PreferenceGroup.objects.order_by("-created_at").values_list("id", flat=True)[:count])
+
+
+def get_group(group_id):
+    """The group row on its own. Raises PreferenceGroup.DoesNotExist."""
+    return PreferenceGroup.objects.get(id=group_id)
+
+
+def load_group(group_id):
+    """The group and its children. Raises PreferenceGroup.DoesNotExist."""
+    queryset = PreferenceGroup.objects.filter(id=group_id)
+    if connections[queryset.db].vendor != "sqlite":
+        return _load_with_queries(queryset.get())
+
+    group = queryset.annotate(children_json=RawSQL(*_children_sql(queryset.db))).get()
+    children = json.loads(group.children_json, parse_float=Decimal)
+    del group.children_json
+    return _build(group, queryset.db, children)
+
+
+def _children_sql(using):
+    quote = connections[using].ops.quote_name
+
+    def table(model):
+        return quote(model._meta.db_table)
+
+    def columns(fields, alias):
+        return ", ".join(f"{alias}.{quote(field)}" for field in fields)
+
+    group_table = table(PreferenceGroup)
+    group_id = f"{group_table}.{quote('id')}"
+
+    def children(model):
+        return (
+            f"json((SELECT json_group_array(json_array({columns(CHILD_FIELDS, 'c')})) "
+            f"FROM (SELECT * FROM {table(model)} WHERE {quote('group_id')} = {group_id} "
+            f"ORDER BY {quote('order_index')}, {quote('id')}) c))"
+        )
+
+    rules = (
+        f"json((SELECT json_group_array(json_array({columns(RULE_FIELDS, 'r')})) "
+        f"FROM {table(DependentRule)} r JOIN {table(DependentIngredient)} i "
+        f"ON i.{quote('id')} = r.{quote('ingredient_id')} WHERE i.{quote('group_id')} = {group_id}))"
+    )
+
+    sql = (
+        f"CASE WHEN {group_table}.{quote('group_type')} = %s "
+        f"THEN json_object('preferences', {children(Preference)}) "
+        f"ELSE json_object('ingredients', {children(DependentIngredient)}, "
+        f"'columns', {children(DependentColumn)}, 'rules', {rules}) END"
+    )
+    return sql, ("Independent",)
+
+
+def _build(group, using, children):
+    def child_objects(model, rows):
+        return [
+            model.from_db(using, CHILD_FIELDS, (pk, name, Decimal(price).quantize(CENT), order_index))
+            for pk, name, price, order_index in rows
+        ]
+
+    ingredients = child_objects(DependentIngredient, children.get("ingredients", ()))
+    columns = child_objects(DependentColumn, children.get("columns", ()))
+    rules = [
+        DependentRule.from_db(using, RULE_FIELDS, (pk, ingredient_id, column_id, *map(bool, flags)))
+        for pk, ingredient_id, column_id, *flags in children.get("rules", ())
+    ]
+    return _attach(LoadedGroup(
+        group,
+        preferences=child_objects(Preference, children.get("preferences", ())),
+        ingredients=ingredients,
+        columns=columns,
+        rules=rules,
+    ))
+
+
+def _load_with_queries(group):
+    if group.group_type == "Independent":
+        return _attach(LoadedGroup(group, preferences=group.preferences.for_edit().order_by("order_index", "id")))
+    return _attach(LoadedGroup(
+        group,
+        ingredients=group.ingredients.for_edit().order_by("order_index", "id"),
+        columns=group.columns.for_edit().order_by("order_index", "id"),
+        rules=DependentRule.objects.for_matrix().filter(ingredient__group=group),
+    ))
+
+
+def _attach(loaded):
+    for obj in (*loaded.preferences, *loaded.ingredients, *loaded.columns):
+        obj.group = loaded.group
+    ingredients = {ingredient.id: ingredient for ingredient in loaded.ingredients}
+    columns = {column.id: column for column in loaded.columns}
+    # Rules pointing at another group's column are not part of this matrix
+    loaded.rules = [rule for rule in loaded.rules if rule.column_id in columns]
+    for rule in loaded.rules:
+        rule.ingredient = ingredients[rule.ingredient_id]
+        rule.column = columns[rule.column_id]
+    return loaded
@@ -0,0 +1,80 @@
+"""Database routing for read replicas.
+
+Reads of menu models go to one of the aliases in
+``settings.RESTAURANT_READ_REPLICAS``; everything else, and every write, goes
+to ``default``. Code that must see its own writes (write requests, sessions
+that wrote recently, background jobs, cache rebuilds and revalidation) runs
+inside ``use_primary()``.
+
+One replica is picked per request (``use_replica()``) and reused for all of
+its reads, so a queryset and its prefetches see the same copy. Reads outside
+a request stick to the replica their context first picked.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+
+_pinned = ContextVar("restaurant_pinned_to_primary", default=False)
+_replica = ContextVar("restaurant_replica", default=None)
+
+REPLICATED_MODELS = {
+    "preferencegroup",
+    "preference",
+    "dependentingredient",
+    "dependentcolumn",
+    "dependentrule",
+}
+
+
+@contextmanager
+def use_primary():
+    """Send every read in this block to the primary database."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def use_replica():
+    """Send every replicated read in this block to the same, randomly picked replica."""
+    aliases = replicas()
+    token = _replica.set(random.choice(aliases) if aliases else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def replicas():
+    return getattr(settings, "RESTAURANT_READ_REPLICAS", [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get():
+            return "default"
+        if model._meta.app_label != "restaurantApp" or model._meta.model_name not in REPLICATED_MODELS:
+            return "default"
+        aliases = replicas()
+        if not aliases:
+            return "default"
+        alias = _replica.get()
+        if alias not in aliases:
+            alias = random.choice(aliases)
+            _replica.set(alias)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+
+# Sent after the transaction that bumped the versions of ``group_ids`` commits
+groups_changed = Signal()
@@ -0,0 +1,28 @@
+"""What a worker does once its WSGI/ASGI application is loaded.
+
+It recovers jobs orphaned by a previous process and, when RESTAURANT_WARM_UP
+is on, warms the caches. Neither may stop the worker from starting:
+failures are logged and the worker starts anyway.
+"""
+import logging
+
+from django.conf import settings
+
+from . import jobs
+
+
+logger = logging.getLogger(__name__)
+
+
+def on_worker_start():
+    try:
+        jobs.recover_orphans()
+    except Exception:
+        logger.exception("Could not recover orphaned jobs")
+
+    if getattr(settings, "RESTAURANT_WARM_UP", False):
+        try:
+            from .warmup import warm_up
+            warm_up()
+        except Exception:
+            logger.exception("Warm-up failed; starting cold")
@@ -1,3 +1,838 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import json
+import marshal
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import history, jobs, menu, pricing, profiling, repository, startup, validation, warmup
+from .admin import EstimatedCountPaginator, estimated_row_count
+from .bulk import apply_operations
+from .management.commands.startup_profile import parse_importtime
+from .middleware import PIN_SESSION_KEY, ReplicaRoutingMiddleware
+from .routers import ReplicaRouter, use_primary, use_replica
+from .models import (
+    CacheGeneration,
+    Job,
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+    GroupChange,
+)
+
+
+@contextmanager
+def forbid_queries():
+    """Fail on any query, e.g. a lazy foreign key load hidden in __str__"""
+    def guard(execute, sql, params, many, context):
+        raise AssertionError(f"Unexpected query: {sql}")
+
+    with connection.execute_wrapper(guard):
+        yield
+
+
+def make_dependent_group(name, ingredients=3, columns=3):
+    group = PreferenceGroup.objects.create(name=name, group_type="Dependent", group_option="N/A")
+    ing_objs = [
+        DependentIngredient.objects.create(group=group, name=f"Ingredient {i}", order_index=i)
+        for i in range(ingredients)
+    ]
+    col_objs = [
+        DependentColumn.objects.create(group=group, name=f"Column {i}", order_index=i)
+        for i in range(columns)
+    ]
+    DependentRule.objects.bulk_create(
+        DependentRule(ingredient=ing, column=col) for ing in ing_objs for col in col_objs
+    )
+    return group
+
+
+class LazyForeignKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dependent = make_dependent_group("Toppings")
+        cls.independent = PreferenceGroup.objects.create(name="Sauces")
+        for i in range(3):
+            Preference.objects.create(group=cls.independent, name=f"Sauce {i}", order_index=i)
+
+    def test_str_does_not_load_parents(self):
+        for model in (Preference, DependentIngredient, DependentColumn, DependentRule):
+            objs = list(model.objects.all())
+            self.assertTrue(objs)
+            with forbid_queries():
+                [str(obj) for obj in objs]
+
+    def test_list_query_count_is_constant(self):
+        for i in range(5):
+            make_dependent_group(f"Extra {i}")
+        with self.assertNumQueries(1):
+            self.client.get(reverse("group_list"))
+
+    def test_edit_query_count_is_constant(self):
+        small = make_dependent_group("Small", 2, 2)
+        large = make_dependent_group("Large", 6, 5)
+        with self.assertNumQueries(1):
+            self.client.get(reverse("group_edit", args=[small.id]))
+        with self.assertNumQueries(1):
+            self.client.get(reverse("group_edit", args=[large.id]))
+
+    def test_loader_fetches_only_the_children_of_the_group_type(self):
+        with self.assertNumQueries(1):
+            loaded = repository.load_group(self.independent.id)
+        self.assertEqual([pref.name for pref in loaded.preferences], ["Sauce 0", "Sauce 1", "Sauce 2"])
+        self.assertEqual((loaded.ingredients, loaded.columns, loaded.rules), ([], [], []))
+
+        DependentRule.objects.filter(pk=DependentRule.objects.order_by("pk")[0].pk).update(required=True)
+        with self.assertNumQueries(1):
+            loaded = repository.load_group(self.dependent.id)
+        self.assertEqual(len(loaded.rules), 9)
+        self.assertEqual(
+            [(rule.show, rule.default, rule.required, rule.allow_more) for rule in loaded.rules].count(
+                (False, False, True, False)
+            ),
+            1,
+        )
+        self.assertEqual(loaded.preferences, [])
+        with forbid_queries():
+            [str(obj) for obj in (*loaded.ingredients, *loaded.columns, *loaded.rules)]
+
+
+class CustomerMenuTests(TestCase):
+    def setUp(self):
+        menu.menu_cache.clear()
+        self.group = make_dependent_group("Toppings")
+        DependentRule.objects.filter(ingredient__order_index=0).update(show=True)
+
+    def test_warm_menu_needs_no_queries(self):
+        url = reverse("menu_group_json", args=[self.group.id])
+        first = self.client.get(url)
+        self.assertEqual(len(first.json()["rows"]), 1)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+            self.client.get(reverse("menu_group", args=[self.group.id]))
+
+    def test_version_bump_invalidates_menu(self):
+        url = reverse("menu_group_json", args=[self.group.id])
+        etag = self.client.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            PreferenceGroup.objects.filter(id=self.group.id).bump_version()
+        self.assertNotEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_change_by_another_worker_is_picked_up(self):
+        url = reverse("menu_group_json", args=[self.group.id])
+        self.client.get(url)
+        # Another process bumps the version; this one receives no signal
+        PreferenceGroup.objects.filter(id=self.group.id).update(name="Extras", version=5)
+        CacheGeneration.bump()
+        menu.menu_cache._next_check = 0
+        self.assertEqual(self.client.get(url).json()["name"], "Extras")
+
+    def test_build_older_than_an_adopted_generation_is_not_cached(self):
+        menu.menu_cache._next_check = 0
+        menu.menu_cache.sync()
+        load_group = repository.load_group
+
+        def load_then_race(group_id):
+            loaded = load_group(group_id)
+            # Another process commits a change and another thread syncs before this build is stored
+            PreferenceGroup.objects.filter(id=group_id).update(name="Extras", version=2)
+            CacheGeneration.bump()
+            menu.menu_cache._next_check = 0
+            menu.menu_cache.sync()
+            return loaded
+
+        with mock.patch.object(repository, "load_group", side_effect=load_then_race):
+            self.assertEqual(menu.get_menu(self.group.id).version, 1)
+        self.assertIsNone(menu.menu_cache.get(self.group.id))
+        self.assertEqual(menu.get_menu(self.group.id).data["name"], "Extras")
+
+
+class PriceTableTests(TestCase):
+    def setUp(self):
+        pricing.price_tables.clear()
+        self.group = make_dependent_group("Toppings", 3, 3)
+        # Menu grid: ingredients 1-2 x columns 1-2, with (0, 0) hidden
+        DependentRule.objects.filter(ingredient__order_index__gte=1, column__order_index__gte=1).update(show=True)
+        DependentRule.objects.filter(ingredient__order_index=1, column__order_index=1).update(show=False)
+        DependentIngredient.objects.filter(group=self.group, order_index=1).update(price="0.10")
+        DependentColumn.objects.filter(group=self.group, order_index=2).update(price="0.20")
+
+    def test_cells_use_menu_coordinates(self):
+        table = pricing.get_price_table(self.group.id)
+        self.assertEqual([table.cell(0, 1), table.cell(1, 0), table.cell(1, 1)], [30, 0, 20])
+        self.assertEqual(table.total(cells=[(0, 1), (0, 1), (0, 1)]), 90)
+        for row, column in ((0, 0), (2, 0)):
+            with self.assertRaises(IndexError):
+                table.cell(row, column)
+
+        data = menu.get_menu(self.group.id).data
+        for row, menu_row in enumerate(data["rows"]):
+            for cell in menu_row["cells"]:
+                self.assertEqual(table.cell(row, cell["column"]), pricing.to_cents(cell["price"]))
+
+    def test_price_endpoint_uses_warm_table(self):
+        url = reverse("menu_group_price", args=[self.group.id])
+        self.assertEqual(self.client.get(url, {"cells": "0:1,1:1"}).json()["total"], "0.50")
+        with self.assertNumQueries(0):
+            self.client.get(url, {"cells": "1:0"})
+        for cells in ("5:0", "0:0"):
+            self.assertEqual(self.client.get(url, {"cells": cells}).status_code, 400)
+
+    def test_parse_price(self):
+        self.assertEqual(str(pricing.parse_price("1.005")), "1.01")
+        self.assertEqual(str(pricing.parse_price("")), "0.00")
+        self.assertEqual(str(pricing.parse_price("-999999.99")), "-999999.99")
+        for value in ("abc", "NaN", "Infinity", "1e30", "1000000", "999999.995"):
+            with self.assertRaises(ValueError):
+                pricing.parse_price(value)
+
+        # The views fall back to a zero price instead of failing the save
+        self.client.post(reverse("group_create"), {
+            "name": "Sauces", "type": "Independent", "group_option": "optional",
+            "pricingMethod": "Individual Pricing", "preferences[]": ["Mayo"], "prices[]": ["1e30"],
+        })
+        self.assertEqual(Preference.objects.get(name="Mayo").price, 0)
+
+
+class MenuValidationTests(TestCase):
+    def menu(self):
+        return [
+            {"name": "Sauces", "type": "Independent", "min_pref": 3, "max_pref": 2,
+             "preferences": [{"name": "Mayo"}, {"name": "Mayo"}]},
+            {"name": "Toppings", "type": "Dependent",
+             "ingredients": [{"name": "Cheese"}], "columns": [{"name": "Extra"}],
+             "rules": [
+                 {"ingredient_index": 0, "column_index": 0, "show": False, "required": True},
+                 {"ingredient_index": 1, "column_index": 0},
+             ]},
+            {"name": "Sauces", "type": "Independent", "preferences": [{"name": "Ketchup"}]},
+        ]
+
+    def test_errors_in_single_process(self):
+        errors = validation.validate_menu(self.menu())
+        self.assertEqual([error["group"] for error in errors], [0, 0, 0, 1, 1, 2])
+        self.assertIn("min_pref (3) is greater than max_pref (2)", errors[0]["message"])
+        self.assertIn("required set on hidden cell", errors[3]["message"])
+        self.assertIn("ingredient_index 1 is out of range", errors[4]["message"])
+        self.assertIn("already used by group 0", errors[5]["message"])
+
+    def test_workers_load_their_own_ranges(self):
+        class InProcessExecutor:
+            # Worker processes could not see this test's transaction
+            ranges = []
+
+            def __init__(self, max_workers, initializer):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def map(self, fn, *iterables):
+                self.ranges.extend(zip(*iterables))
+                return map(fn, *iterables)
+
+        groups = [make_dependent_group(name, 2, 2) for name in ("Toppings", "Sauces", "Toppings ", "Sides", "Extras")]
+        DependentRule.objects.filter(ingredient__group=groups[1]).update(show=False, required=True)
+        ids = [group.id for group in groups]
+
+        single, count = validation.validate_database(workers=1)
+        self.assertEqual(count, 5)
+        self.assertEqual([error["group"] for error in single], [1, 1, 1, 1, 2])
+        self.assertEqual(single, validation.validate_menu(validation.menu_from_database()))
+
+        with mock.patch.object(validation, "ProcessPoolExecutor", InProcessExecutor), \
+                mock.patch.object(validation.connections, "close_all"):
+            sharded, count = validation.validate_database(workers=2, chunk_size=2)
+        self.assertEqual(sharded, single)
+        self.assertEqual(InProcessExecutor.ranges, [(0, ids[0], ids[1]), (2, ids[2], ids[3]), (4, ids[4], ids[4])])
+
+    def test_default_is_one_worker(self):
+        with mock.patch.object(validation, "ProcessPoolExecutor") as executor:
+            make_dependent_group("Toppings", 1, 1)
+            make_dependent_group("Sauces", 1, 1)
+            self.assertEqual(validation.validate_database(chunk_size=1), ([], 2))
+        executor.assert_not_called()
+
+
+class BulkOperationsTests(TestCase):
+    def setUp(self):
+        self.groups = [make_dependent_group(f"Toppings {i}", 2, 2) for i in range(2)]
+        self.url = reverse("bulk_operations")
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type="application/json")
+
+    def test_counts_and_versions(self):
+        response = self.post({"operations": [
+            {"op": "adjust_price", "target": "column", "name": "Column 0", "delta": "0.50"},
+            {"op": "set_rule_flags", "column": "Column 1", "flags": {"show": True}},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total_updated"], 2 + 4)
+        self.assertEqual(DependentColumn.objects.get(group=self.groups[0], name="Column 0").price, Decimal("0.50"))
+        self.assertEqual(DependentRule.objects.filter(show=True).count(), 4)
+        # One bump per operation
+        self.assertEqual({g.version for g in PreferenceGroup.objects.all()}, {3})
+
+    def test_failing_operation_rolls_back_the_batch(self):
+        response = self.post({"operations": [
+            {"op": "adjust_price", "target": "column", "name": "Column 0", "delta": "1"},
+            {"op": "reorder", "target": "column", "group_id": self.groups[0].id, "order": []},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DependentColumn.objects.exclude(price=0).exists())
+        self.assertEqual({g.version for g in PreferenceGroup.objects.all()}, {1})
+
+    def test_malformed_input_is_a_400(self):
+        group_id = self.groups[0].id
+        for payload in (
+            [],
+            {"operations": [{"op": "set_rule_flags", "column": "Column 0", "flags": ["show"]}]},
+            {"operations": [{"op": "set_rule_flags", "column": "Column 0", "flags": {"show": "false"}}]},
+            {"operations": [{"op": "reorder", "target": "column", "group_id": group_id, "order": ["x"]}]},
+            {"operations": [{"op": "adjust_price", "target": "column", "name": "Column 0", "delta": "NaN"}]},
+            {"operations": [{"op": "adjust_price", "target": "column", "name": "Column 0", "delta": "1e30"}]},
+            {"operations": [{"op": "adjust_price", "target": "column", "delta": 1, "group_ids": "1"}]},
+        ):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        self.assertFalse(DependentRule.objects.filter(show=True).exists())
+
+    def test_unfiltered_operations_are_rejected(self):
+        for op in (
+            {"op": "adjust_price", "target": "column", "delta": "1"},
+            {"op": "set_rule_flags", "flags": {"show": True}},
+        ):
+            with self.subTest(op=op):
+                self.assertEqual(self.post({"operations": [op]}).status_code, 400)
+        # An empty id list matches nothing rather than every row
+        response = self.post({"operations": [
+            {"op": "set_rule_flags", "group_ids": [], "flags": {"show": True}},
+        ]})
+        self.assertEqual(response.json()["total_updated"], 0)
+        self.assertEqual({g.version for g in PreferenceGroup.objects.all()}, {1})
+
+
+class EditConcurrencyTests(TestCase):
+    def setUp(self):
+        self.group = PreferenceGroup.objects.create(name="Sauces")
+        self.url = reverse("group_edit", args=[self.group.id])
+
+    def post(self, **fields):
+        data = {
+            "name": "Sauces", "type": "Independent", "group_option": "optional",
+            "pricingMethod": "No Charge", "preferences[]": ["Mayo"], "prices[]": ["0"],
+            **fields,
+        }
+        return self.client.post(self.url, data)
+
+    def test_missing_version_is_rejected(self):
+        response = self.client.post(self.url, {"name": "Dips"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(PreferenceGroup.objects.get().name, "Sauces")
+
+    def test_group_price_is_parsed_and_bounded(self):
+        self.assertEqual(self.post(version=1, groupPrice="1e30").status_code, 302)
+        group = PreferenceGroup.objects.get()
+        self.assertEqual((group.version, group.group_price), (1, 0))
+        self.post(version=1, groupPrice="2.345")
+        self.assertEqual(PreferenceGroup.objects.get().group_price, Decimal("2.35"))
+
+    def test_unknown_group_is_a_404(self):
+        missing = self.group.id + 1
+        self.assertEqual(self.client.post(reverse("group_edit", args=[missing]), {"version": 1}).status_code, 404)
+        self.assertEqual(self.client.post(reverse("group_delete", args=[missing])).status_code, 404)
+
+    def test_stale_version_gets_a_conflict_with_the_changed_fields(self):
+        self.assertEqual(self.post(name="Dips", version=1).status_code, 302)
+        response = self.post(name="Sauces", version=1)
+        self.assertEqual(response.status_code, 409)
+        body = response.json()
+        self.assertEqual((body["submitted_version"], body["current_version"]), (1, 2))
+        self.assertEqual(body["changed_fields"], {"name": {"submitted": "Sauces", "current": "Dips"}})
+        self.assertEqual(response["ETag"], PreferenceGroup.objects.get().etag)
+        self.assertEqual(PreferenceGroup.objects.get().name, "Dips")
+
+
+class PayloadLimitTests(TestCase):
+    def post_dependent(self, ingredients=2, columns=2, **fields):
+        return self.client.post(reverse("group_create"), {
+            "name": "Wraps", "type": "Dependent", "pricingMethod": "No Charge",
+            "ingredients[]": [f"I{i}" for i in range(ingredients)], "ingredients_price[]": ["0"] * ingredients,
+            "columns[]": [f"C{i}" for i in range(columns)], "columns_price[]": ["0"] * columns,
+            **fields,
+        })
+
+    def assertNothingWritten(self):
+        self.assertFalse(PreferenceGroup.objects.exists())
+        self.assertFalse(DependentIngredient.objects.exists())
+        self.assertFalse(DependentRule.objects.exists())
+
+    @override_settings(RESTAURANT_MAX_REQUEST_BYTES=1024)
+    def test_oversized_body_is_rejected_before_csrf_reads_it(self):
+        client = self.client_class(enforce_csrf_checks=True)
+        with mock.patch("django.middleware.csrf.CsrfViewMiddleware.process_view") as csrf:
+            response = client.post(reverse("group_create"), {"name": "x" * 2048})
+        self.assertEqual(response.status_code, 413)
+        csrf.assert_not_called()
+        self.assertNothingWritten()
+
+    @override_settings(RESTAURANT_MAX_INGREDIENTS=3, RESTAURANT_MAX_RULE_CELLS=6)
+    def test_count_limits_are_413(self):
+        self.assertEqual(self.post_dependent(ingredients=4, columns=1).status_code, 413)
+        self.assertEqual(self.post_dependent(ingredients=3, columns=3).status_code, 413)
+        rules = json.dumps([{"ingredient_index": 0, "column_index": 0}] * 7)
+        self.assertEqual(self.post_dependent(rules_json=rules).status_code, 413)
+        self.assertNothingWritten()
+
+    def test_rules_that_are_not_objects_are_a_400(self):
+        response = self.post_dependent(rules_json='[{"ingredient_index": 0, "column_index": 0}, 1]')
+        self.assertEqual(response.status_code, 400)
+        self.assertNothingWritten()
+
+
+@jobs.register("test_cancel_self")
+def _cancel_self_job(context, payload):
+    jobs.cancel(context.job.pk)
+    context.progress(1, 2)
+    return {"finished": True}
+
+
+@jobs.register("test_orphaned_mid_run")
+def _orphaned_mid_run_job(context, payload):
+    # Orphan recovery fails the job while its handler is still going
+    Job.objects.filter(pk=context.job.pk).update(status="failed", error="Orphaned")
+    if payload.get("report"):
+        context.progress(1, 2)
+    return {"finished": True}
+
+
+class JobRunnerTests(TestCase):
+    def create_dependent(self, name, size):
+        return self.client.post(reverse("group_create"), {
+            "name": name, "type": "Dependent", "pricingMethod": "No Charge",
+            "ingredients[]": [f"I{i}" for i in range(size)], "ingredients_price[]": ["0"] * size,
+            "columns[]": [f"C{i}" for i in range(size)], "columns_price[]": ["0"] * size,
+        })
+
+    @override_settings(RESTAURANT_BACKGROUND_MATRIX_SIZE=4, RESTAURANT_RULE_BATCH_SIZE=4)
+    def test_large_matrices_are_handed_to_a_job(self):
+        with self.captureOnCommitCallbacks():
+            self.create_dependent("Small", 2)
+            self.create_dependent("Large", 3)
+        self.assertEqual(DependentRule.objects.count(), 4)
+        job = Job.objects.get()
+        self.assertEqual((job.kind, job.status, job.progress_total), ("build_rules", "queued", 9))
+
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress_done, job.result), ("succeeded", 9, {"created": 9}))
+        self.assertEqual(DependentRule.objects.count(), 13)
+
+    def test_cancellation(self):
+        with self.captureOnCommitCallbacks():
+            queued = jobs.enqueue("test_cancel_self")
+            running = jobs.enqueue("test_cancel_self")
+        jobs.cancel(queued.pk)
+        jobs.run_job(queued.pk)
+        jobs.run_job(running.pk)
+        for job in (queued, running):
+            job.refresh_from_db()
+            self.assertEqual(job.status, "cancelled")
+        self.assertEqual(running.progress_done, 1)
+        self.assertIsNone(running.result)
+
+    @override_settings(RESTAURANT_BACKGROUND_MATRIX_SIZE=4)
+    def test_orphaned_jobs_are_failed_or_requeued(self):
+        with self.captureOnCommitCallbacks():
+            self.create_dependent("Large", 3)
+            queued = jobs.enqueue("test_cancel_self")
+        running = Job.objects.get(kind="build_rules")
+        stale = timezone.now() - timedelta(hours=1)
+        Job.objects.filter(pk=running.pk).update(status="running", heartbeat_at=stale)
+        Job.objects.filter(pk=queued.pk).update(created_at=stale)
+        DependentRule.objects.create(
+            ingredient_id=running.payload["ingredient_ids"][0], column_id=running.payload["column_ids"][0]
+        )
+
+        executor = mock.Mock()
+        with mock.patch.object(jobs, "_get_executor", return_value=executor), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.recover_orphans(), (1, 1))
+        executor.submit.assert_called_once_with(jobs._run, queued.pk)
+
+        status = self.client.get(reverse("job_status", args=[running.pk])).json()
+        self.assertEqual(status["status"], "failed")
+        self.assertTrue(status["error"].startswith("Orphaned"))
+        self.assertFalse(DependentRule.objects.exists())
+        self.assertEqual(PreferenceGroup.objects.get(name="Large").version, 2)
+
+    @override_settings(RESTAURANT_BACKGROUND_MATRIX_SIZE=4, RESTAURANT_RULE_BATCH_SIZE=4)
+    def test_failed_job_leaves_no_partial_matrix(self):
+        with self.captureOnCommitCallbacks():
+            self.create_dependent("Large", 3)
+        job = Job.objects.get()
+        # The last cell already has a rule, so the third batch fails after two have committed
+        DependentRule.objects.create(
+            ingredient_id=job.payload["ingredient_ids"][-1], column_id=job.payload["column_ids"][-1]
+        )
+        jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress_done), ("failed", 8))
+        self.assertFalse(DependentRule.objects.exists())
+
+    def test_abandoned_job_keeps_its_outcome(self):
+        for report in (False, True):
+            with self.captureOnCommitCallbacks():
+                job = jobs.enqueue("test_orphaned_mid_run", {"report": report})
+            jobs.run_job(job.pk)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.error, job.result), ("failed", "Orphaned", None))
+
+    def test_status_reports_orphans_without_writing(self):
+        with self.captureOnCommitCallbacks():
+            job = jobs.enqueue("test_cancel_self")
+        Job.objects.filter(pk=job.pk).update(status="running", heartbeat_at=timezone.now() - timedelta(hours=1))
+        url = reverse("job_status", args=[job.pk])
+        with CaptureQueriesContext(connection) as queries:
+            status = self.client.get(url).json()
+        self.assertEqual((status["status"], status["orphaned"]), ("running", True))
+        self.assertTrue(all(query["sql"].startswith("SELECT") for query in queries))
+
+        status = self.client.post(reverse("job_cancel", args=[job.pk])).json()
+        self.assertEqual(status["status"], "failed")
+        self.assertFalse(self.client.get(url).json()["orphaned"])
+
+
+class ChangeLogTests(TestCase):
+    def change(self, group, minute, update):
+        """Apply ``update``, log it, date the entry ``minute`` minutes in and return that moment and state"""
+        update()
+        PreferenceGroup.objects.filter(id=group.id).bump_version()
+        entry = history.record_change(group)
+        at = self.start + timedelta(minutes=minute)
+        GroupChange.objects.filter(id=entry.id).update(created_at=at)
+        return at, history.serialize_group(group)
+
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=1)
+        self.group = make_dependent_group("Toppings")
+
+    def test_states_round_trip(self):
+        ingredients = DependentIngredient.objects.filter(group=self.group)
+        columns = DependentColumn.objects.filter(group=self.group)
+        steps = [
+            lambda: None,
+            lambda: ingredients.filter(order_index=1).update(price="1.25"),
+            lambda: DependentRule.objects.filter(column__order_index=2).update(show=True, required=True),
+            lambda: columns.filter(order_index=1).delete(),
+            lambda: DependentIngredient.objects.create(group=self.group, name="Olives", order_index=9),
+            lambda: PreferenceGroup.objects.filter(id=self.group.id).update(name="Extras"),
+        ]
+        expected = [self.change(self.group, minute, step) for minute, step in enumerate(steps)]
+        self.assertEqual(
+            list(GroupChange.objects.values_list("kind", flat=True)), ["snapshot"] + ["delta"] * 5
+        )
+
+        for at, state in expected:
+            self.assertEqual(history.group_at(self.group.id, at), state)
+        self.assertIsNone(history.group_at(self.group.id, self.start - timedelta(minutes=1)))
+
+        history.record_deletion(self.group)
+        self.assertIsNone(history.group_at(self.group.id))
+        at, state = expected[-1]
+        self.assertEqual(history.group_at(self.group.id, at), state)
+
+    @override_settings(RESTAURANT_SNAPSHOT_INTERVAL=3)
+    def test_snapshot_interval(self):
+        column = DependentColumn.objects.get(group=self.group, order_index=0)
+        for minute in range(4):
+            self.change(self.group, minute, lambda: DependentColumn.objects.filter(id=column.id).update(
+                price=F("price") + 1
+            ))
+        for delta in ("1", "1", "1"):
+            apply_operations([{"op": "adjust_price", "target": "column", "name": "Column 0", "delta": delta}])
+        self.assertEqual(
+            list(GroupChange.objects.values_list("kind", flat=True)),
+            ["snapshot", "delta", "delta", "snapshot", "delta", "delta", "snapshot"],
+        )
+        self.assertEqual(history.group_at(self.group.id), history.serialize_group(self.group))
+
+    def test_bulk_logging_does_not_grow_with_the_group_count(self):
+        small = [make_dependent_group(f"Small {i}").id for i in range(2)]
+        large = [make_dependent_group(f"Large {i}").id for i in range(6)]
+        counts = []
+        for group_ids in (small, large, small, large):
+            with CaptureQueriesContext(connection) as queries:
+                apply_operations([
+                    {"op": "adjust_price", "target": "column", "name": "Column 0", "delta": "1", "group_ids": group_ids},
+                    {"op": "set_rule_flags", "column": "Column 1", "flags": {"show": True}, "group_ids": group_ids},
+                ])
+            counts.append(len(queries))
+        # The first round writes snapshots, the second deltas
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(counts[2], counts[3])
+        for group_id in large:
+            self.assertEqual(history.group_at(group_id), history.serialize_groups([group_id])[group_id])
+
+
+@override_settings(RESTAURANT_READ_REPLICAS=["replica1", "replica2", "replica3"])
+class ReplicaRoutingTests(TestCase):
+    def read_alias(self):
+        return ReplicaRouter().db_for_read(PreferenceGroup)
+
+    def test_one_replica_per_request(self):
+        router = ReplicaRouter()
+        seen = set()
+        for _ in range(20):
+            with use_replica():
+                aliases = {router.db_for_read(model) for model in (PreferenceGroup, DependentRule, Preference)}
+                self.assertEqual(len(aliases), 1)
+                seen |= aliases
+        self.assertGreater(len(seen), 1)
+        self.assertEqual(router.db_for_read(Job), "default")
+        self.assertEqual(router.db_for_write(PreferenceGroup), "default")
+        with use_primary():
+            self.assertEqual(router.db_for_read(PreferenceGroup), "default")
+
+    def test_writes_pin_the_session_to_the_primary(self):
+        request_factory = RequestFactory()
+        seen = []
+        middleware = ReplicaRoutingMiddleware(lambda request: seen.append(self.read_alias()) or HttpResponse())
+        session = {}
+        for method in ("get", "post", "get"):
+            request = getattr(request_factory, method)("/")
+            request.session = session
+            middleware(request)
+        self.assertIn(seen[0], ["replica1", "replica2", "replica3"])
+        self.assertEqual(seen[1:], ["default", "default"])
+
+        session[PIN_SESSION_KEY] = 0
+        request = request_factory.get("/")
+        request.session = session
+        middleware(request)
+        self.assertNotEqual(seen[-1], "default")
+
+    def test_caches_build_and_revalidate_from_the_primary(self):
+        # The replica aliases are not configured databases, so any replica read fails
+        with use_primary():
+            group = make_dependent_group("Toppings")
+        for cache in (menu.menu_cache, pricing.price_tables):
+            cache.clear()
+            cache._next_check = 0
+        with use_replica():
+            self.assertEqual(menu.get_menu(group.id).version, 1)
+            self.assertEqual(pricing.get_price_table(group.id).version, 1)
+            PreferenceGroup.objects.filter(id=group.id).update(version=2)
+            CacheGeneration.bump()
+            for cache in (menu.menu_cache, pricing.price_tables):
+                cache._next_check = 0
+                cache.sync()
+                self.assertIsNone(cache.get(group.id))
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.group = make_dependent_group("Toppings")
+        user = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(user)
+
+    def test_row_estimate_refreshes_table_statistics(self):
+        make_dependent_group("Extras")
+        rules = DependentRule.objects.all()
+        with override_settings(RESTAURANT_TABLE_STATS_MAX_AGE=0):
+            self.assertEqual(estimated_row_count(DependentRule), 18)
+            rules.filter(column__group=self.group).delete()
+            self.assertEqual(estimated_row_count(DependentRule), rules.count())
+
+    def test_small_changelists_are_counted_exactly(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        # The statistics still say 9 rules
+        DependentRule.objects.filter(ingredient__order_index=0).delete()
+        with override_settings(RESTAURANT_TABLE_STATS_MAX_AGE=3600):
+            paginator = EstimatedCountPaginator(DependentRule.objects.order_by("pk"), 100)
+            self.assertEqual(paginator.count, 6)
+
+    def test_rule_changelist_filters_by_group_id(self):
+        other = make_dependent_group("Extras", 2, 2)
+        url = reverse("admin:restaurantApp_dependentrule_changelist")
+        response = self.client.get(url, {"group": other.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count, 4)
+
+    def test_deleting_a_child_bumps_the_group_version(self):
+        column = DependentColumn.objects.filter(group=self.group).first()
+        url = reverse("admin:restaurantApp_dependentcolumn_delete", args=[column.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(url, {"post": "yes"}).status_code, 302)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.version, 2)
+        self.assertEqual(len(history.group_at(self.group.id)["columns"]), 2)
+
+
+class StartupTests(TestCase):
+    def test_warm_up_builds_menus_and_closes_connections(self):
+        group = make_dependent_group("Toppings")
+        menu.menu_cache.clear()
+        with mock.patch.object(warmup.connections, "close_all") as close_all:
+            timings = warmup.warm_up()
+        self.assertEqual(set(timings), {"warm_urls", "warm_templates", "warm_database", "warm_menus"})
+        self.assertIsNotNone(menu.menu_cache.get(group.id))
+        close_all.assert_called_once()
+
+        with mock.patch.object(warmup.connections, "close_all") as close_all, \
+                mock.patch.object(warmup.menu, "get_menu", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                warmup.warm_up()
+        close_all.assert_called_once()
+
+    @override_settings(RESTAURANT_WARM_UP=True)
+    def test_failures_do_not_stop_the_app_from_loading(self):
+        with mock.patch.object(jobs, "recover_orphans", side_effect=RuntimeError("no database")), \
+                mock.patch.object(warmup, "warm_up", side_effect=RuntimeError("no database")), \
+                self.assertLogs("restaurantApp.startup", "ERROR") as logs:
+            for name in ("restaurant.wsgi", "restaurant.asgi"):
+                sys.modules.pop(name, None)
+                module = importlib.import_module(name)
+                self.assertIsNotNone(module.application)
+        self.assertEqual(len(logs.records), 4)
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _io\n"
+            "import time:      2500 |      14000 | restaurantApp.pricing\n"
+            "some other warning\n"
+        )
+        self.assertEqual(parse_importtime(stderr), [("_io", 120, 120), ("restaurantApp.pricing", 2500, 14000)])
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        profiling_settings = override_settings(
+            RESTAURANT_PROFILING=True, RESTAURANT_PROFILE_SAMPLE_RATE=0.0,
+            RESTAURANT_PROFILE_DIR=directory.name, RESTAURANT_PROFILE_KEEP=2,
+        )
+        profiling_settings.enable()
+        self.addCleanup(profiling_settings.disable)
+        self.addCleanup(profiling.reset)
+        self.staff = User.objects.create_superuser("admin", "admin@example.com", "password")
+
+    def profile_id(self, client):
+        response = client.get(reverse("group_list"), HTTP_X_PROFILE="1")
+        return response.headers.get("X-Profile-Id")
+
+    def test_header_profiles_one_request_for_staff(self):
+        self.assertIsNone(self.profile_id(self.client_class()))
+        client = self.client_class()
+        client.force_login(self.staff)
+        profile_id = self.profile_id(client)
+        self.assertRegex(profile_id, r"^[0-9a-f]{32}$")
+
+        stats = marshal.loads(client.get(reverse("profiling_request", args=[profile_id, "pstats"])).content)
+        self.assertTrue(any(name == "preference_group_list" for _, _, name in stats))
+        collapsed = client.get(reverse("profiling_request", args=[profile_id, "collapsed"]))
+        self.assertEqual(collapsed["Content-Disposition"], f'attachment; filename="{profile_id}.collapsed"')
+        for line in collapsed.content.decode().splitlines():
+            self.assertRegex(line, r" \d+$")
+
+        # Stored on disk, so another worker could serve it; only the newest are kept
+        newer = [self.profile_id(client) for _ in range(2)]
+        self.assertEqual(client.get(reverse("profiling_request", args=[profile_id, "pstats"])).status_code, 404)
+        self.assertEqual(sorted(path.stem for path in profiling._stored_profiles(profiling._profile_dir())), sorted(newer))
+
+    @override_settings(RESTAURANT_PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_merged_per_view(self):
+        client = self.client_class()
+        client.force_login(self.staff)
+        for _ in range(2):
+            client.get(reverse("group_list"))
+        self.assertEqual(client.get(reverse("profiling_summary")).json()["views"]["group_list"], 2)
+        response = client.get(reverse("profiling_view", args=["group_list", "pstats"]))
+        self.assertTrue(marshal.loads(response.content))
+        client.post(reverse("profiling_summary"))
+        self.assertEqual(client.get(reverse("profiling_view", args=["group_list", "pstats"])).status_code, 404)
+
+    def test_profilers_are_imported_lazily(self):
+        script = (
+            "import django, sys; django.setup(); "
+            "import restaurantApp.views, restaurantApp.middleware; "
+            "print(sorted(set(sys.modules) & {'cProfile', 'pstats'}))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "restaurant.settings"},
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
+
+
+class SeedMenuTests(TestCase):
+    def seed(self, **options):
+        call_command("seed_menu", groups=3, seed=7, stdout=io.StringIO(), **options)
+        rows = [
+            *PreferenceGroup.objects.order_by("name").values_list(
+                "name", "group_type", "group_option", "pricing_method", "group_price", "min_pref", "max_pref",
+            ),
+            *(
+                (model.__name__, *row)
+                for model in (Preference, DependentIngredient, DependentColumn)
+                for row in model.objects.order_by("group__name", "order_index").values_list(
+                    "group__name", "name", "price", "order_index",
+                )
+            ),
+            *DependentRule.objects.order_by("ingredient__group__name", "ingredient__order_index", "column__order_index")
+            .values_list(
+                "ingredient__group__name", "ingredient__order_index", "column__order_index",
+                "show", "default", "allow_more", "required",
+            ),
+        ]
+        models = (PreferenceGroup, Preference, DependentIngredient, DependentColumn, DependentRule)
+        counts = [model.objects.count() for model in models]
+        return counts, hashlib.sha256(repr(rows).encode()).hexdigest()
+
+    def test_same_seed_gives_the_same_rows(self):
+        counts, digest = self.seed(dependent_ratio=0.7)
+        self.assertEqual(counts[0], 3)
+        cells = sum(
+            DependentIngredient.objects.filter(group=group).count() * DependentColumn.objects.filter(group=group).count()
+            for group in PreferenceGroup.objects.filter(group_type="Dependent")
+        )
+        self.assertGreater(cells, 0)
+        self.assertEqual(counts[4], cells)
+        # Flags are only ever set on shown cells
+        hidden = DependentRule.objects.filter(show=False)
+        self.assertFalse(hidden.exclude(default=False, allow_more=False, required=False).exists())
+
+        PreferenceGroup.objects.all().delete()
+        self.assertEqual(self.seed(dependent_ratio=0.7, batch_size=2), (counts, digest))
+        with self.assertRaises(CommandError):
+            self.seed(dependent_ratio=0.7)
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaisesMessage(CommandError, "--batch-size"):
+            self.seed(batch_size=0)
@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
@@ -6,4 +6,15 @@ urlpatterns = [
     path('groups/new/', views.preference_group_create, name='group_create'),
     path('groups/<int:group_id>/edit/', views.preference_group_edit, name='group_edit'),
     path('groups/<int:group_id>/delete/', views.preference_group_delete, name='group_delete'),
+    path('api/groups/<int:group_id>/history/', views.preference_group_history, name='group_history'),
+    path('menu/<int:group_id>/', views.menu_group_html, name='menu_group'),
+    path('api/menu/<int:group_id>/', views.menu_group_json, name='menu_group_json'),
+    path('api/menu/<int:group_id>/price/', views.menu_group_price, name='menu_group_price'),
+    path('api/bulk/', views.bulk_operations, name='bulk_operations'),
+    path('api/jobs/<int:job_id>/', views.job_status, name='job_status'),
+    path('api/jobs/<int:job_id>/cancel/', views.job_cancel, name='job_cancel'),
+    path('api/cache/stats/', views.cache_stats, name='cache_stats'),
+    path('profiling/', views.profiling_summary, name='profiling_summary'),
+    re_path(r'^profiling/views/(?P<view_name>[\w.-]+)\.(?P<fmt>pstats|collapsed)$', views.profiling_view, name='profiling_view'),
+    re_path(r'^profiling/requests/(?P<profile_id>[0-9a-f]{32})\.(?P<fmt>pstats|collapsed)$', views.profiling_request, name='profiling_request'),
 ]
\ No newline at end of file
@@ -0,0 +1,231 @@
+"""Consistency checks for imported menus.
+
+A menu is a list of plain group dicts::
+
+    {
+        "name": ..., "type": "Independent" | "Dependent", "group_option": ...,
+        "min_pref": ..., "max_pref": ...,
+        "preferences": [{"name": ..., "price": ...}, ...],
+        "ingredients": [...], "columns": [...],
+        "rules": [{"ingredient_index": ..., "column_index": ..., "show": ...,
+                   "default": ..., "required": ..., "allow_more": ...}, ...],
+    }
+
+Groups are checked independently of each other; only the check that group
+names are unique needs every group, and it runs on the names alone.
+
+``validate_menu`` checks a menu already in memory, in this process: sending
+the dicts to other processes costs more (pickling and unpickling) than the
+checks themselves. ``validate_database`` checks the stored menu. With
+RESTAURANT_VALIDATION_WORKERS above 1 it splits the groups into id ranges of
+RESTAURANT_VALIDATION_CHUNK_SIZE groups, and each worker process loads and
+checks its own ranges, so only the range bounds and the errors cross process
+boundaries. With one worker the whole menu is loaded with one query per table.
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+
+from .models import (
+    PreferenceGroup,
+    Preference,
+    DependentIngredient,
+    DependentColumn,
+    DependentRule,
+)
+
+
+RULE_FLAGS = ("default", "required", "allow_more")
+
+
+def _error(index, group, message):
+    return {"group": index, "name": group.get("name"), "message": message}
+
+
+def _duplicates(items):
+    names = (item.get("name") for item in items if isinstance(item, dict))
+    counts = Counter(name.strip() for name in names if isinstance(name, str))
+    return sorted(name for name, count in counts.items() if count > 1)
+
+
+def check_group(index, group):
+    """Return the problems found in one group, as error dicts"""
+    errors = []
+
+    def error(message):
+        errors.append(_error(index, group, message))
+
+    if not str(group.get("name") or "").strip():
+        error("Group name is required")
+
+    group_type = group.get("type")
+    if group_type not in ("Independent", "Dependent"):
+        error(f"Unknown group type {group_type!r}")
+        return errors
+
+    if group_type == "Independent":
+        preferences = group.get("preferences") or []
+        min_pref, max_pref = group.get("min_pref"), group.get("max_pref")
+        for field, value in (("min_pref", min_pref), ("max_pref", max_pref)):
+            if value is not None and (not isinstance(value, int) or value < 0):
+                error(f"{field} must be a non-negative integer")
+                return errors
+        if min_pref is not None and max_pref is not None and min_pref > max_pref:
+            error(f"min_pref ({min_pref}) is greater than max_pref ({max_pref})")
+        if min_pref is not None and min_pref > len(preferences):
+            error(f"min_pref ({min_pref}) is more than the {len(preferences)} preferences")
+        if group.get("group_option") == "required" and min_pref == 0:
+            error("Required group allows selecting nothing (min_pref is 0)")
+        for name in _duplicates(preferences):
+            error(f"Duplicate preference name {name!r}")
+        return errors
+
+    ingredients = group.get("ingredients") or []
+    columns = group.get("columns") or []
+    for section, items in (("ingredient", ingredients), ("column", columns)):
+        for name in _duplicates(items):
+            error(f"Duplicate {section} name {name!r}")
+
+    cells = set()
+    for position, rule in enumerate(group.get("rules") or []):
+        if not isinstance(rule, dict):
+            error(f"Rule {position} is not an object")
+            continue
+        ing_idx, col_idx = rule.get("ingredient_index"), rule.get("column_index")
+        if not (isinstance(ing_idx, int) and 0 <= ing_idx < len(ingredients)):
+            error(f"Rule {position}: ingredient_index {ing_idx!r} is out of range")
+            continue
+        if not (isinstance(col_idx, int) and 0 <= col_idx < len(columns)):
+            error(f"Rule {position}: column_index {col_idx!r} is out of range")
+            continue
+        if (ing_idx, col_idx) in cells:
+            error(f"Rule {position}: duplicate rule for cell ({ing_idx}, {col_idx})")
+        cells.add((ing_idx, col_idx))
+        if not rule.get("show"):
+            flags = [flag for flag in RULE_FLAGS if rule.get(flag)]
+            if flags:
+                error(f"Rule {position}: {', '.join(flags)} set on hidden cell ({ing_idx}, {col_idx})")
+    return errors
+
+
+def check_groups(start, groups):
+    """Errors of consecutive groups, the first of which is group ``start`` of the menu"""
+    errors = []
+    for offset, group in enumerate(groups):
+        errors.extend(check_group(start + offset, group))
+    return errors
+
+
+def check_names(groups):
+    """Errors for group names used more than once, from (index, group) pairs"""
+    errors = []
+    first_seen = {}
+    for index, group in groups:
+        name = group.get("name")
+        if not isinstance(name, str) or not name.strip():
+            continue
+        key = name.strip()
+        if key in first_seen:
+            errors.append(_error(index, group, f"Group name is already used by group {first_seen[key]}"))
+        else:
+            first_seen[key] = index
+    return errors
+
+
+def validate_menu(groups):
+    """Check every group of a menu and return the list of error dicts, ordered by group"""
+    errors = check_groups(0, groups) + check_names(enumerate(groups))
+    errors.sort(key=lambda error: error["group"])
+    return errors
+
+
+def menu_from_database(first_id=None, last_id=None):
+    """Stored groups in the menu format, ordered by id, read with one query per table.
+
+    ``first_id`` and ``last_id`` limit it to an inclusive range of group ids.
+    """
+    def in_range(queryset, field):
+        if first_id is not None:
+            queryset = queryset.filter(**{f"{field}__gte": first_id})
+        if last_id is not None:
+            queryset = queryset.filter(**{f"{field}__lte": last_id})
+        return queryset
+
+    children = {}
+    positions = {}
+    for section, model in (("preferences", Preference), ("ingredients", DependentIngredient), ("columns", DependentColumn)):
+        children[section] = defaultdict(list)
+        rows = in_range(model.objects.select_related(None), "group_id").order_by("group_id", "order_index", "id")
+        for pk, group_id, name, price in rows.values_list("id", "group_id", "name", "price"):
+            positions[section, pk] = len(children[section][group_id])
+            children[section][group_id].append({"name": name, "price": str(price)})
+
+    rules = defaultdict(list)
+    rows = in_range(DependentRule.objects.select_related(None), "ingredient__group_id").values_list(
+        "ingredient__group_id", "ingredient_id", "column_id", "show", "default", "required", "allow_more",
+    )
+    for group_id, ingredient_id, column_id, show, default, required, allow_more in rows.iterator(chunk_size=10000):
+        rules[group_id].append({
+            "ingredient_index": positions.get(("ingredients", ingredient_id)),
+            "column_index": positions.get(("columns", column_id)),
+            "show": show,
+            "default": default,
+            "required": required,
+            "allow_more": allow_more,
+        })
+
+    groups = in_range(PreferenceGroup.objects, "id").order_by("id").values_list(
+        "id", "name", "group_type", "group_option", "min_pref", "max_pref",
+    )
+    return [
+        {
+            "name": name,
+            "type": group_type,
+            "group_option": group_option,
+            "min_pref": min_pref,
+            "max_pref": max_pref,
+            "preferences": children["preferences"][pk],
+            "ingredients": children["ingredients"][pk],
+            "columns": children["columns"][pk],
+            "rules": rules[pk],
+        }
+        for pk, name, group_type, group_option, min_pref, max_pref in groups
+    ]
+
+
+def _check_range(start, first_id, last_id):
+    return check_groups(start, menu_from_database(first_id, last_id))
+
+
+def _start_worker():
+    # Needed under the spawn start method; a no-op in forked workers
+    django.setup()
+
+
+def validate_database(workers=None, chunk_size=None):
+    """Check every stored group; returns (error dicts ordered by group, number of groups)"""
+    if workers is None:
+        workers = getattr(settings, "RESTAURANT_VALIDATION_WORKERS", 1) or 1
+    if chunk_size is None:
+        chunk_size = getattr(settings, "RESTAURANT_VALIDATION_CHUNK_SIZE", 2000)
+
+    names = list(PreferenceGroup.objects.order_by("id").values_list("id", "name"))
+    ranges = [
+        (start, names[start][0], names[min(start + chunk_size, len(names)) - 1][0])
+        for start in range(0, len(names), chunk_size)
+    ]
+    if workers <= 1 or len(ranges) <= 1:
+        errors = _check_range(0, None, None)
+    else:
+        # Forked workers must not share this process's database handles
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), initializer=_start_worker) as executor:
+            reports = executor.map(_check_range, *zip(*ranges))
+            errors = [error for report in reports for error in report]
+
+    errors += check_names((index, {"name": name}) for index, (_, name) in enumerate(names))
+    errors.sort(key=lambda error: error["group"])
+    return errors, len(names)
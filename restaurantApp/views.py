@@ -1,25 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest, Http404
+from django.contrib.admin.views.decorators import staff_member_required
 import json
+from itertools import islice
+from django.conf import settings
 from django.db import transaction
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import (
     PreferenceGroup,
     Preference,
     DependentIngredient,
     DependentColumn,
     DependentRule,
+    Job,
+    GroupChange,
 )
+from . import guards, history, jobs, menu, pricing, profiling, repository
+from .bulk import BulkOperationError, apply_operations
+
+
+def _get_group_or_404(group_id):
+    try:
+        return repository.get_group(group_id)
+    except PreferenceGroup.DoesNotExist:
+        raise Http404("No such group")
 
 
 def preference_group_list(request):
     """List all preference groups with optimized queries"""
-    groups = PreferenceGroup.objects.all().order_by("-created_at").prefetch_related(
-        'preferences',
-        'ingredients',
-        'columns',
-        'ingredients__rules__column'
-    )
+    groups = repository.list_groups()
     return render(request, "group_list.html", {"groups": groups})
 
 
@@ -30,6 +42,11 @@ def preference_group_create(request):
     if request.method != "POST":
         return HttpResponseBadRequest("Invalid method")
 
+    try:
+        rules_data = guards.validate_group_payload(request)
+    except guards.PayloadRejected as e:
+        return HttpResponse(str(e), status=e.status)
+
     name = request.POST.get("name")
     group_type = request.POST.get("type")
     group_option = "N/A" if request.POST.get("type").strip() == "Dependent" else request.POST.get("group_option", "").strip()
@@ -47,6 +64,13 @@ def preference_group_create(request):
         messages.error(request, "Group name is required")
         return render(request, "new_group.html")
 
+    try:
+        group_price = pricing.parse_price(group_price)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return render(request, "new_group.html")
+
+    job = None
     try:
         with transaction.atomic():
             group = PreferenceGroup.objects.create(
@@ -75,7 +99,7 @@ def preference_group_create(request):
                 for order_index, (pref_name, price) in enumerate(zip(prefs, prices)):
                     if pref_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             Preference.objects.create(
                                 group=group, 
                                 name=pref_name.strip(), 
@@ -86,7 +110,7 @@ def preference_group_create(request):
                             Preference.objects.create(
                                 group=group, 
                                 name=pref_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
 
@@ -107,7 +131,7 @@ def preference_group_create(request):
                 for order_index, (ing_name, price) in enumerate(zip(ingredients, ingredients_price)):
                     if ing_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             ing_obj = DependentIngredient.objects.create(
                                 group=group, 
                                 name=ing_name.strip(), 
@@ -119,7 +143,7 @@ def preference_group_create(request):
                             ing_obj = DependentIngredient.objects.create(
                                 group=group, 
                                 name=ing_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
                             ing_objs.append(ing_obj)
@@ -129,7 +153,7 @@ def preference_group_create(request):
                 for order_index, (col_name, price) in enumerate(zip(columns, columns_price)):
                     if col_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             col_obj = DependentColumn.objects.create(
                                 group=group, 
                                 name=col_name.strip(), 
@@ -141,74 +165,20 @@ def preference_group_create(request):
                             col_obj = DependentColumn.objects.create(
                                 group=group, 
                                 name=col_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
                             col_objs.append(col_obj)
 
                 # Handle rules
-                rules_json = request.POST.get("rules_json")
-                if rules_json:
-                    try:
-                        rules_data = json.loads(rules_json)
-                        
-                        for rule in rules_data:
-                            ing_idx = rule.get("ingredient_index")
-                            col_idx = rule.get("column_index")
-                            show = rule.get("show", False)
-                            default = rule.get("default", False)
-                            required = rule.get("required", False)
-                            allow_more = rule.get("allow_more", False)
-
-                            if (ing_idx is not None and col_idx is not None and 
-                                0 <= ing_idx < len(ing_objs) and 0 <= col_idx < len(col_objs)):
-                                
-                                DependentRule.objects.create(
-                                    ingredient=ing_objs[ing_idx],
-                                    column=col_objs[col_idx],
-                                    show=bool(show),
-                                    default=bool(default),
-                                    required=bool(required),
-                                    allow_more=bool(allow_more),
-                                )
-                        
-                        # If no rules were created, create default rules
-                        if len(rules_data) == 0:
-                            for ing_obj in ing_objs:
-                                for col_obj in col_objs:
-                                    DependentRule.objects.create(
-                                        ingredient=ing_obj,
-                                        column=col_obj,
-                                        show=False,
-                                        default=False,
-                                        required=False,
-                                        allow_more=False,
-                                    )
-                    
-                    except json.JSONDecodeError:
-                        for ing_obj in ing_objs:
-                            for col_obj in col_objs:
-                                DependentRule.objects.create(
-                                    ingredient=ing_obj,
-                                    column=col_obj,
-                                    show=False,
-                                    default=False,
-                                    required=False,
-                                    allow_more=False,
-                                )
-                else:
-                    for ing_obj in ing_objs:
-                        for col_obj in col_objs:
-                            DependentRule.objects.create(
-                                ingredient=ing_obj,
-                                column=col_obj,
-                                show=False,
-                                default=False,
-                                required=False,
-                                allow_more=False,
-                            )
+                job = _save_rules(group, ing_objs, col_objs, rules_data)
+
+            group.refresh_from_db()
+            history.record_change(group)
 
         messages.success(request, f"Preference group '{name}' created successfully!")
+        if job:
+            messages.info(request, f"Rules for '{name}' are being generated in the background (job #{job.id})")
         return redirect("group_list")
 
     except Exception as e:
@@ -216,36 +186,113 @@ def preference_group_create(request):
         return render(request, "new_group.html")
 
 
+def _rule_objects(ingredient_ids, column_ids, rules_data):
+    """Yield unsaved rules from the submitted rules, or a blank grid if none were sent"""
+    if rules_data:
+        for rule in rules_data:
+            ing_idx = rule.get("ingredient_index")
+            col_idx = rule.get("column_index")
+
+            if (ing_idx is not None and col_idx is not None and
+                0 <= ing_idx < len(ingredient_ids) and 0 <= col_idx < len(column_ids)):
+
+                yield DependentRule(
+                    ingredient_id=ingredient_ids[ing_idx],
+                    column_id=column_ids[col_idx],
+                    show=bool(rule.get("show", False)),
+                    default=bool(rule.get("default", False)),
+                    required=bool(rule.get("required", False)),
+                    allow_more=bool(rule.get("allow_more", False)),
+                )
+        return
+
+    # If no rules were sent, create default rules
+    for ingredient_id in ingredient_ids:
+        for column_id in column_ids:
+            yield DependentRule(ingredient_id=ingredient_id, column_id=column_id)
+
+
+def _create_rules(ingredient_ids, column_ids, rules_data, context=None):
+    """Bulk insert rules in chunks, reporting progress to a background job if given"""
+    total = len(ingredient_ids) * len(column_ids)
+    batch_size = getattr(settings, "RESTAURANT_RULE_BATCH_SIZE", 500)
+    created = 0
+    rules = _rule_objects(ingredient_ids, column_ids, rules_data)
+    while batch := list(islice(rules, batch_size)):
+        with transaction.atomic():
+            DependentRule.objects.bulk_create(batch)
+        created += len(batch)
+        if context:
+            context.progress(created, total)
+    return created
+
+
+def _save_rules(group, ing_objs, col_objs, rules_data):
+    """Create the group's rules now, or hand large matrices to a background job"""
+    ingredient_ids = [obj.id for obj in ing_objs]
+    column_ids = [obj.id for obj in col_objs]
+    cells = len(ingredient_ids) * len(column_ids)
+
+    if cells <= getattr(settings, "RESTAURANT_BACKGROUND_MATRIX_SIZE", 2500):
+        _create_rules(ingredient_ids, column_ids, rules_data)
+        return None
+
+    return jobs.enqueue("build_rules", {
+        'group_id': group.id,
+        'ingredient_ids': ingredient_ids,
+        'column_ids': column_ids,
+        'rules': rules_data,
+    }, total=cells)
+
+
+def _discard_rules(payload):
+    """Drop the rules a failed, cancelled or orphaned build_rules job had created"""
+    DependentRule.objects.filter(ingredient_id__in=payload['ingredient_ids']).delete()
+    PreferenceGroup.objects.filter(id=payload['group_id']).bump_version()
+    history.record_changes([payload['group_id']])
+
+
+@jobs.register("build_rules", cleanup=_discard_rules)
+def _build_rules_job(context, payload):
+    # Each batch commits on its own so the write lock is released between batches.
+    # A job that stops part-way leaves no partial matrix, as a synchronous save would.
+    try:
+        created = _create_rules(
+            payload['ingredient_ids'], payload['column_ids'], payload['rules'], context
+        )
+    except jobs.JobAbandoned:
+        # Orphan recovery has already run the cleanup
+        raise
+    except Exception:
+        _discard_rules(payload)
+        raise
+    PreferenceGroup.objects.filter(id=payload['group_id']).bump_version()
+    history.record_changes([payload['group_id']])
+    return {'created': created}
+
+
 def preference_group_edit(request, group_id):
     """Edit an existing preference group"""
-    group = get_object_or_404(PreferenceGroup, id=group_id)
-    
     if request.method == "GET":
-        context = {
-            'group': group,
-        }
-        
-        # Load data with proper ordering
-        preferences = group.preferences.all().order_by('order_index')
-        context['preferences'] = preferences
-
-        ingredients = group.ingredients.all().order_by('order_index')
-        columns = group.columns.all().order_by('order_index')
-        
-        # Prefetch rules for efficient querying
-        ingredients_with_rules = ingredients.prefetch_related('rules__column')
-        
+        try:
+            loaded = repository.load_group(group_id)
+        except PreferenceGroup.DoesNotExist:
+            raise Http404("No such group")
+        group = loaded.group
+
         # Create rules matrix
+        rules = loaded.rules_by_ingredient()
         rules_matrix = []
-        for ingredient in ingredients_with_rules:
+        for ingredient in loaded.ingredients:
             ingredient_data = {
                 'ingredient_name': ingredient.name,
                 'ingredient_id': ingredient.id,
                 'ingredient_price': ingredient.price,
                 'rules': []
             }
-            for column in columns:
-                rule = next((r for r in ingredient.rules.all() if r.column_id == column.id), None)
+            rules_by_column = rules[ingredient.id]
+            for column in loaded.columns:
+                rule = rules_by_column.get(column.id)
                 ingredient_data['rules'].append({
                     'ingredient_id': ingredient.id,
                     'column_id': column.id,
@@ -257,17 +304,27 @@ def preference_group_edit(request, group_id):
                     'allow_more': rule.allow_more if rule else False,
                 })
             rules_matrix.append(ingredient_data)
-        
-        context.update({
-            'ingredients': ingredients,
-            'columns': columns,
+
+        context = {
+            'group': group,
+            'preferences': loaded.preferences,
+            'ingredients': loaded.ingredients,
+            'columns': loaded.columns,
             'rules_matrix': rules_matrix,
-        })
-            
-        return render(request, "edit_group.html", context)
-    
+        }
+        response = render(request, "edit_group.html", context)
+        response["ETag"] = group.etag
+        return response
+
     if request.method != "POST":
         return HttpResponseBadRequest("Invalid method")
+
+    group = _get_group_or_404(group_id)
+
+    try:
+        rules_data = guards.validate_group_payload(request)
+    except guards.PayloadRejected as e:
+        return HttpResponse(str(e), status=e.status)
     
     print("POST Data:", request.POST.dict(),"-------------------")
 
@@ -280,22 +337,41 @@ def preference_group_edit(request, group_id):
     max_pref = request.POST.get("maxPref") or 10
     group_price = request.POST.get("groupPrice") or 0
 
+    # The version the form was loaded at; without it a stale form would silently win
+    try:
+        version = int(request.POST["version"])
+    except KeyError:
+        return HttpResponseBadRequest("Missing version")
+    except ValueError:
+        return HttpResponseBadRequest("Invalid version")
+
     if not name:
         messages.error(request, "Group name is required")
         return redirect("group_edit", group_id=group_id)
 
+    try:
+        group_price = pricing.parse_price(group_price)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect("group_edit", group_id=group_id)
+
+    job = None
     try:
         with transaction.atomic():
-            # Update the main group
-            group.name = name
-            group.group_type = group_type
-            group.group_option = group_option
-            group.multiple_selection_limit = bool(multiple_selection)
-            group.pricing_method = pricing_method
-            group.min_pref = min_pref
-            group.max_pref = max_pref
-            group.group_price = group_price
-            group.save()
+            # Update the main group only if nobody saved it since the form was loaded
+            fields = {
+                'name': name,
+                'group_type': group_type,
+                'group_option': group_option,
+                'multiple_selection_limit': bool(multiple_selection),
+                'pricing_method': pricing_method,
+                'min_pref': min_pref,
+                'max_pref': max_pref,
+                'group_price': group_price,
+            }
+            rows = PreferenceGroup.objects.filter(id=group_id, version=version)
+            if not rows.bump_version(**fields):
+                return _version_conflict(group_id, version, fields)
 
             # --- Independent Group ---
             if group_type == "Independent":
@@ -311,7 +387,7 @@ def preference_group_edit(request, group_id):
                 for order_index, (pref_name, price) in enumerate(zip(prefs, prices)):
                     if pref_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             Preference.objects.create(
                                 group=group, 
                                 name=pref_name.strip(), 
@@ -322,7 +398,7 @@ def preference_group_edit(request, group_id):
                             Preference.objects.create(
                                 group=group, 
                                 name=pref_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
 
@@ -351,7 +427,7 @@ def preference_group_edit(request, group_id):
                 for order_index, (ing_name, price) in enumerate(zip(ingredients, ingredients_price)):
                     if ing_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             ing_obj = DependentIngredient.objects.create(
                                 group=group, 
                                 name=ing_name.strip(), 
@@ -363,7 +439,7 @@ def preference_group_edit(request, group_id):
                             ing_obj = DependentIngredient.objects.create(
                                 group=group, 
                                 name=ing_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
                             ing_objs.append(ing_obj)
@@ -373,7 +449,7 @@ def preference_group_edit(request, group_id):
                 for order_index, (col_name, price) in enumerate(zip(columns, columns_price)):
                     if col_name.strip():
                         try:
-                            price_value = float(price) if price else 0.0
+                            price_value = pricing.parse_price(price)
                             col_obj = DependentColumn.objects.create(
                                 group=group, 
                                 name=col_name.strip(), 
@@ -385,81 +461,22 @@ def preference_group_edit(request, group_id):
                             col_obj = DependentColumn.objects.create(
                                 group=group, 
                                 name=col_name.strip(), 
-                                price=0.0,
+                                price=0,
                                 order_index=order_index
                             )
                             col_objs.append(col_obj)
 
                 # Handle rules
-                rules_json = request.POST.get("rules_json")
-                print(f"Received rules_json: {rules_json}")
-                
-                if rules_json:
-                    try:
-                        rules_data = json.loads(rules_json)
-                        
-                        for rule in rules_data:
-                            ing_idx = rule.get("ingredient_index")
-                            col_idx = rule.get("column_index")
-                            show = rule.get("show", False)
-                            default = rule.get("default", False)
-                            required = rule.get("required", False)
-                            allow_more = rule.get("allow_more", False)
-
-                            print(f"Processing rule: ing_idx={ing_idx}, col_idx={col_idx}, show={show}, default={default}, required={required}, allow_more={allow_more}")
-
-                            if (ing_idx is not None and col_idx is not None and 
-                                0 <= ing_idx < len(ing_objs) and 0 <= col_idx < len(col_objs)):
-                                
-                                DependentRule.objects.create(
-                                    ingredient=ing_objs[ing_idx],
-                                    column=col_objs[col_idx],
-                                    show=bool(show),
-                                    default=bool(default),
-                                    required=bool(required),
-                                    allow_more=bool(allow_more)
-                                )
-                        
-                        # If no rules were created, create default rules
-                        if len(rules_data) == 0:
-                            for ing_obj in ing_objs:
-                                for col_obj in col_objs:
-                                    DependentRule.objects.create(
-                                        ingredient=ing_obj,
-                                        column=col_obj,
-                                        show=False,
-                                        default=False,
-                                        required=False,
-                                        allow_more=False,
-                                    )
-                    
-                    except json.JSONDecodeError as e:
-                        print(f"JSON decode error: {e}")
-                        for ing_obj in ing_objs:
-                            for col_obj in col_objs:
-                                DependentRule.objects.create(
-                                    ingredient=ing_obj,
-                                    column=col_obj,
-                                    show=False,
-                                    default=False,
-                                    required=False,
-                                    allow_more=False,
-                                )
-                else:
-                    print("No rules JSON provided, creating default rules")
-                    for ing_obj in ing_objs:
-                        for col_obj in col_objs:
-                            DependentRule.objects.create(
-                                ingredient=ing_obj,
-                                column=col_obj,
-                                show=False,
-                                default=False,
-                                required=False,
-                                allow_more=False,
-                            )
+                print(f"Received rules: {rules_data}")
+                job = _save_rules(group, ing_objs, col_objs, rules_data)
+
+            group.refresh_from_db()
+            history.record_change(group)
 
         messages.success(request, f"Preference group '{name}' updated successfully!")
-        return redirect("group_edit")
+        if job:
+            messages.info(request, f"Rules for '{name}' are being generated in the background (job #{job.id})")
+        return redirect("group_edit", group_id=group_id)
 
     except Exception as e:
         messages.error(request, f"Error updating preference group: {str(e)}")
@@ -469,14 +486,196 @@ def preference_group_edit(request, group_id):
         return redirect("group_edit", group_id=group_id)
 
 
+def _version_conflict(group_id, version, submitted):
+    """Build a 409 response listing the group fields that differ from the submission"""
+    current = _get_group_or_404(group_id)
+    changed = {}
+    for field, value in submitted.items():
+        current_value = getattr(current, field)
+        try:
+            value = PreferenceGroup._meta.get_field(field).to_python(value)
+        except ValidationError:
+            pass
+        if current_value != value:
+            changed[field] = {'submitted': str(value), 'current': str(current_value)}
+
+    response = JsonResponse({
+        'error': 'This group was changed by someone else. Reload it and apply your edits again.',
+        'submitted_version': version,
+        'current_version': current.version,
+        'changed_fields': changed,
+    }, status=409)
+    response["ETag"] = current.etag
+    return response
+
+
 def preference_group_delete(request, group_id):
     """Delete a preference group"""
-    group = get_object_or_404(PreferenceGroup, id=group_id)
+    group = _get_group_or_404(group_id)
     
     if request.method == "POST":
         group_name = group.name
-        group.delete()
+        with transaction.atomic():
+            history.record_deletion(group)
+            group.delete()
         messages.success(request, f"Preference group '{group_name}' deleted successfully!")
         return redirect("group_list")
     
-    return redirect("group_list")
\ No newline at end of file
+    return redirect("group_list")
+
+def bulk_operations(request):
+    """Apply set-based price, flag and ordering updates across groups"""
+    if request.method != "POST":
+        return HttpResponseBadRequest("Invalid method")
+
+    try:
+        payload = json.loads(request.body or b"{}")
+        if not isinstance(payload, dict):
+            raise BulkOperationError("The request body must be a JSON object")
+        operations = payload.get("operations")
+        if not isinstance(operations, list):
+            raise BulkOperationError("'operations' must be a list")
+        results = apply_operations(operations)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except BulkOperationError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "results": results,
+        "total_updated": sum(r["updated"] for r in results),
+    })
+
+
+def job_status(request, job_id):
+    """Report the status and progress of a background job"""
+    job = get_object_or_404(Job, id=job_id)
+    return JsonResponse({**job.as_dict(), 'orphaned': jobs.is_orphaned(job)})
+
+
+def job_cancel(request, job_id):
+    """Request cancellation of a background job"""
+    if request.method != "POST":
+        return HttpResponseBadRequest("Invalid method")
+
+    jobs.cancel(job_id)
+    # A running job whose worker is gone will never see the request; fail it now
+    job = jobs.check_orphaned(get_object_or_404(Job, id=job_id))
+    return JsonResponse(job.as_dict())
+
+
+def preference_group_history(request, group_id):
+    """Return a group's change log, or its state at ?at=<ISO timestamp>"""
+    at = request.GET.get("at")
+    if at is None:
+        changes = GroupChange.objects.filter(group_id=group_id).values('id', 'version', 'kind', 'created_at')
+        return JsonResponse({'group_id': group_id, 'changes': list(changes)})
+
+    timestamp = parse_datetime(at)
+    if timestamp is None:
+        return JsonResponse({"error": "'at' must be an ISO 8601 timestamp"}, status=400)
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+
+    state = history.group_at(group_id, timestamp)
+    if state is None:
+        return JsonResponse({"error": "Group did not exist at that time"}, status=404)
+    return JsonResponse({'group_id': group_id, 'at': timestamp.isoformat(), 'state': state})
+
+
+@staff_member_required
+def profiling_summary(request):
+    """List the views that have sampled profiles"""
+    if request.method == "POST":
+        profiling.reset()
+    return JsonResponse({'views': profiling.view_summary()})
+
+
+def _profile_download(result, name, fmt):
+    if result is None:
+        raise Http404("No profile recorded")
+    if fmt == "pstats":
+        response = HttpResponse(result.pstats_bytes(), content_type="application/octet-stream")
+    else:
+        response = HttpResponse(result.collapsed(), content_type="text/plain; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+@staff_member_required
+def profiling_view(request, view_name, fmt):
+    """Download the merged profile of a view"""
+    return _profile_download(profiling.get_view_result(view_name), view_name, fmt)
+
+
+@staff_member_required
+def profiling_request(request, profile_id, fmt):
+    """Download the profile of a single request made with the profiling header"""
+    return _profile_download(profiling.get_request_result(profile_id), profile_id, fmt)
+
+
+def _menu_response(request, group_id, build_response):
+    try:
+        compiled = menu.get_menu(group_id)
+    except PreferenceGroup.DoesNotExist:
+        raise Http404("No such group")
+
+    if request.headers.get("If-None-Match") == compiled.etag:
+        response = HttpResponse(status=304)
+    else:
+        response = build_response(compiled)
+    response["ETag"] = compiled.etag
+    return response
+
+
+def menu_group_html(request, group_id):
+    """Customer menu for a group as an HTML fragment"""
+    return _menu_response(request, group_id, lambda compiled: HttpResponse(compiled.html))
+
+
+def menu_group_json(request, group_id):
+    """Customer menu for a group as JSON"""
+    return _menu_response(
+        request, group_id,
+        lambda compiled: HttpResponse(compiled.json, content_type="application/json"),
+    )
+
+
+def menu_group_price(request, group_id):
+    """Price a selection: ?preferences=0,2 and/or ?cells=row:column,row:column
+
+    Preferences are positions in order_index order. Cells use the menu JSON's
+    coordinates (visible rows and columns only); hidden cells are rejected.
+    """
+    try:
+        table = pricing.get_price_table(group_id)
+    except PreferenceGroup.DoesNotExist:
+        raise Http404("No such group")
+
+    try:
+        preferences = [
+            int(index) for index in request.GET.get("preferences", "").split(",") if index.strip()
+        ]
+        cells = [
+            tuple(int(index) for index in cell.split(":", 1))
+            for cell in request.GET.get("cells", "").split(",") if cell.strip()
+        ]
+        total = table.total(preferences, cells)
+    except (ValueError, TypeError, IndexError) as e:
+        return HttpResponseBadRequest(f"Invalid selection: {e}")
+
+    return JsonResponse({
+        'group_id': group_id,
+        'version': table.version,
+        'total_cents': total,
+        'total': pricing.format_cents(total),
+    })
+
+
+@staff_member_required
+def cache_stats(request):
+    """Hit rates and sizes of this worker's in-process caches"""
+    return JsonResponse({
+        'menu': menu.menu_cache.stats(),
+        'prices': pricing.price_tables.stats(),
+    })
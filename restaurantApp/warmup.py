@@ -0,0 +1,51 @@
+"""Process start-up warm-up.
+
+Called by ``startup.on_worker_start`` (when RESTAURANT_WARM_UP is on) so
+the first real request does not pay for URL resolver population, template
+compilation, opening the database connection and building menus.
+"""
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import get_resolver, reverse
+
+from . import menu, repository
+
+
+WARM_TEMPLATES = ("group_list.html", "edit_group.html", "new_group.html", "menu_group.html")
+
+
+def warm_urls():
+    get_resolver().url_patterns
+    reverse("group_list")
+
+
+def warm_templates():
+    for name in WARM_TEMPLATES:
+        get_template(name)
+
+
+def warm_database():
+    list(repository.list_groups()[:1])
+
+
+def warm_menus():
+    count = getattr(settings, "RESTAURANT_WARM_MENUS", 100)
+    for group_id in repository.recent_group_ids(count):
+        menu.get_menu(group_id)
+
+
+def warm_up():
+    """Run every warm-up step and return how long each took, in seconds"""
+    timings = {}
+    try:
+        for step in (warm_urls, warm_templates, warm_database, warm_menus):
+            start = time.perf_counter()
+            step()
+            timings[step.__name__] = time.perf_counter() - start
+    finally:
+        # Don't hand open connections to workers forked after a preload
+        connections.close_all()
+    return timings